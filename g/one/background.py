@@ -0,0 +1,49 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import pyglet
+
+from g.one.resources import Resources
+from g.one.layers import BACKGROUND
+
+
+class Background():
+    """The background of a game, drawn as a single quad at the back of the
+    game's drawing batch.
+
+    The background texture is mipmapped, so when the window's viewport is
+    smaller than the game's 854x480 drawing area the texture is sampled from
+    a correspondingly downsampled level instead of being scaled on every
+    frame.
+    """
+    def __init__(self, batch):
+        """Keyword arguments:
+
+        batch -- the drawing batch this background belongs to
+        """
+        texture = Resources.space_image.get_texture()
+        group = pyglet.graphics.TextureGroup(texture, parent=BACKGROUND)
+        self.vertex_list = batch.add(
+          4, pyglet.gl.GL_QUADS, group,
+          ('v2i/static', (0, 0, 854, 0, 854, 480, 0, 480)),
+          ('t3f/static', texture.tex_coords)
+        )
+
+    def delete(self):
+        """Frees the vertex list."""
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
@@ -23,6 +23,8 @@ class BackgroundMusic():
     """Player of background music.  Music is looped and correct volume is set
     automatically.  This is a static class.
     """
+    music = None
+
     @classmethod
     def init(cls):
         """Call this once during initialisation"""
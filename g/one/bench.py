@@ -0,0 +1,630 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Benchmarks for G-One.  Run them with:
+
+    python -m g.one.bench [name ...]
+
+All benchmarks are run if no names are given.  Results are printed to stdout
+as JSON so that runs can be compared between commits.  Benchmarks which need
+a display, such as render_scale, are only run when named.
+
+Most benchmarks are scenarios: scripted headless games which report their tick
+rate, tick times, peak entity counts and peak resident memory.  Each benchmark
+is run in its own process so that peak memory is measured per benchmark.
+"""
+
+from g.one import headless
+
+import argparse
+import gc
+import io
+import json
+import random
+import subprocess
+import sys
+import time
+
+import pyglet
+from pyglet.window import key
+
+from g.one import snapshot
+from g.one.bullet import BOUNCY_BULLET
+from g.one.game_pickler import GamePickler, GameUnpickler
+from g.one.options import Options
+from g.one.profiler import Profiler
+from g.one.resources import Resources
+from g.one.rewind import Rewind
+from g.one.sprite import Box
+from g.one.spatial_hash import SpatialHash
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+benchmarks = {}
+display_benchmarks = set()
+
+
+def benchmark(function):
+    """Decorator which registers a benchmark under the function's name."""
+    benchmarks[function.__name__] = function
+    return function
+
+
+def needs_display(function):
+    """Decorator which marks a benchmark as needing a display and GL, so that
+    it is not run by default.  Apply it below @benchmark.
+    """
+    display_benchmarks.add(function.__name__)
+    return function
+
+
+def random_boxes(rng, amount, width, height):
+    """Returns a list of Boxes scattered over and around the playfield."""
+    boxes = []
+    for i in range(amount):
+        left = rng.uniform(-width*1.5, 854+width/2)
+        bottom = rng.uniform(-height*1.5, 480+height/2)
+        boxes.append(Box(left, left+width, bottom, bottom+height))
+    return boxes
+
+
+@benchmark
+def collision(bullets=1000, repeats=5):
+    """Compares the linear scan against the SpatialHash broad-phase for an
+    increasing number of enemies.  Every bullet is checked against every
+    enemy as Bullet.update does, and the results are checked to be identical.
+    """
+    rng = random.Random(0)
+    results = []
+    for enemies in (8, 16, 32, 64, 128, 256, 512):
+        enemy_boxes = random_boxes(rng, enemies, 24, 24)
+        bullet_boxes = random_boxes(rng, bullets, 4, 8)
+        index = SpatialHash()
+
+        linear = float('inf')
+        for i in range(repeats):
+            start = time.perf_counter()
+            expected = [b.collide_once(enemy_boxes) for b in bullet_boxes]
+            linear = min(linear, time.perf_counter() - start)
+
+        hashed = float('inf')
+        for i in range(repeats):
+            start = time.perf_counter()
+            index.rebuild(enemy_boxes)
+            found = [b.collide_once(index) for b in bullet_boxes]
+            hashed = min(hashed, time.perf_counter() - start)
+
+        if found != expected:
+            raise AssertionError("SpatialHash results differ from linear scan")
+        results.append({
+            'enemies': enemies,
+            'bullets': bullets,
+            'linear_ms': linear * 1000,
+            'spatial_hash_ms': hashed * 1000,
+            'speedup': linear / hashed,
+        })
+    return results
+
+
+def peak_rss():
+    """Returns the peak resident memory of this process in KiB, or None if it
+    cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports bytes rather than KiB
+        rss //= 1024
+    return rss
+
+
+def percentile(ordered, fraction):
+    """Returns the given percentile (0 to 1) of an ordered list."""
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run_scenario(game, ticks, controller, until=None):
+    """Steps a headless game like headless.run, timing every tick, and returns
+    a report of the results.  If provided, the scenario also ends as soon as
+    until(game) returns True.
+    """
+    Profiler.enabled = True
+    Profiler.reset()
+    times = []
+    peak_enemies = 0
+    peak_bullets = 0
+    for tick in range(ticks):
+        controller(game, tick)
+        start = time.perf_counter()
+        game.world.step()
+        times.append(time.perf_counter() - start)
+        if game.deleted:
+            break
+        peak_enemies = max(peak_enemies, len(game.enemies))
+        peak_bullets = max(peak_bullets, len(game.bullets))
+        if until is not None and until(game):
+            break
+    ordered = sorted(times)
+    return {
+      'ticks': len(times),
+      'ticks_per_second': len(times) / sum(times),
+      'tick_ms': {
+        'p50': percentile(ordered, 0.5) * 1000,
+        'p99': percentile(ordered, 0.99) * 1000,
+        'max': ordered[-1] * 1000,
+      },
+      'peak_enemies': peak_enemies,
+      'peak_bullets': peak_bullets,
+      'peak_rss_kib': peak_rss(),
+      'score': game.score,
+      'bullet_pool': None if game.deleted else game.bullets.stats(),
+      'profiler': Profiler.report()['timings'],
+    }
+
+
+def autopilot(game, tick):
+    """Keeps every player firing while sweeping across the screen, and keeps
+    the game from being lost.  Lives are kept high as large cascades can cost
+    many lives in a single tick.
+    """
+    for i, player in enumerate(game.players):
+        player.on_key(key.SPACE, True)
+        left = (tick // 120 + i) % 2 == 0
+        player.on_key(key.LEFT, left)
+        player.on_key(key.RIGHT, not left)
+    if game.lives < 1000:
+        game.lives = 1000
+
+
+def start_at_level(game, level):
+    """Makes a game which has not been stepped yet start at the given level"""
+    game.level = level - 1
+
+
+def endless_level1(game, tick):
+    """Runs the autopilot and keeps the level 1 spawner from finishing"""
+    autopilot(game, tick)
+    if game.spawner is not None and game.spawner.count >= 19:
+        game.spawner.count = 10
+
+
+@benchmark
+def level1(ticks=3600):
+    """Level 1 on Normal with its spawner kept from ever finishing."""
+    game = headless.new_game(difficulty=0)
+    return run_scenario(game, ticks, endless_level1)
+
+
+@benchmark
+def level2_hard(ticks=3600):
+    """Level 2 on Hard, where every BasicEnemy fires bouncy bullets, with its
+    spawner kept from ever finishing.
+    """
+    game = headless.new_game(difficulty=1, players=2)
+    start_at_level(game, 2)
+
+    def controller(game, tick):
+        autopilot(game, tick)
+        if game.spawner is not None and game.spawner.count >= 9:
+            game.spawner.count = 8
+    return run_scenario(game, ticks, controller)
+
+
+def cascade(game, tick):
+    """Runs the autopilot and keeps the winning score out of reach"""
+    autopilot(game, tick)
+    if game.score >= 300:
+        game.score -= 300
+
+
+def late_level3(enemies):
+    """Returns a headless game on Level 3 on Hard which has been played as in
+    level3_cascade until it has at least the given number of enemies.
+    """
+    game = headless.new_game(difficulty=1, players=2)
+    start_at_level(game, 3)
+    tick = 0
+    while len(game.enemies) < enemies:
+        cascade(game, tick)
+        game.world.step()
+        tick += 1
+    return game
+
+
+@benchmark
+def level3_cascade(ticks=7200, max_enemies=2000):
+    """Level 3 on Hard with the winning score kept out of reach, so the
+    SplitterEnemy cascade grows for as long as it is hit.  Ends once there
+    are max_enemies enemies.
+    """
+    game = headless.new_game(difficulty=1, players=2)
+    start_at_level(game, 3)
+    return run_scenario(game, ticks, cascade,
+                        lambda game: len(game.enemies) >= max_enemies)
+
+
+@benchmark
+def bullets_5000(ticks=1800):
+    """Level 1 with the bullet count topped up to 5000 every tick, half
+    fired by each side.
+    """
+    game = headless.new_game(difficulty=0)
+    rng = random.Random(0)
+
+    def controller(game, tick):
+        endless_level1(game, tick)
+        for i in range(5000 - len(game.bullets)):
+            pos = (rng.uniform(0, 854), rng.uniform(0, 480))
+            vel = (rng.uniform(-500, 500), rng.uniform(-500, 500))
+            game.bullets.spawn(BOUNCY_BULLET, i % 2 == 0, pos, vel)
+    return run_scenario(game, ticks, controller)
+
+
+@benchmark
+def savestates(repeats=20, enemies=300):
+    """Times saving and loading a late Level 3 game as a snapshot and with
+    pickle, as savestates used to be, and reports their sizes.  Also times
+    the part of loading a snapshot which is left to the main thread.
+    """
+    game = late_level3(enemies)
+    formats = {
+      'pickle': (lambda f: GamePickler(f).dump(game),
+                 lambda f: GameUnpickler(f, None).load()),
+      'snapshot': (lambda f: snapshot.write(f, "", game),
+                   lambda f: snapshot.read(f, None)),
+    }
+    results = {'enemies': len(game.enemies), 'bullets': len(game.bullets)}
+    for name, (save, load) in formats.items():
+        save_times = []
+        load_times = []
+        for i in range(repeats):
+            f = io.BytesIO()
+            start = time.perf_counter()
+            save(f)
+            save_times.append(time.perf_counter() - start)
+            f.seek(0)
+            start = time.perf_counter()
+            load(f)
+            load_times.append(time.perf_counter() - start)
+        results[name] = {
+          'bytes': len(f.getvalue()),
+          'save_ms': percentile(sorted(save_times), 0.5) * 1000,
+          'load_ms': percentile(sorted(load_times), 0.5) * 1000,
+        }
+    # Only restoring a decoded snapshot blocks the main thread when loading in
+    # the background; see savestate.load_state_async.
+    f = io.BytesIO()
+    snapshot.write(f, "", game)
+    f.seek(0)
+    state = snapshot.decode(f)
+    restore_times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        snapshot.restore(state, None)
+        restore_times.append(time.perf_counter() - start)
+    results['snapshot']['restore_ms'] = (
+      percentile(sorted(restore_times), 0.5) * 1000)
+    return results
+
+
+@benchmark
+def savestate_codecs(repeats=5, enemies=1000):
+    """Times compressing and decompressing a snapshot of a late Level 3 game
+    with every codec, as savestates are when they are saved and loaded, and
+    reports their sizes.
+    """
+    game = late_level3(enemies)
+    raw = io.BytesIO()
+    snapshot.write(raw, "", game)
+    results = {'enemies': len(game.enemies), 'bullets': len(game.bullets)}
+    for codec in snapshot.CODEC_NAMES:
+        save_times = []
+        load_times = []
+        for i in range(repeats):
+            raw.seek(0)
+            f = io.BytesIO()
+            start = time.perf_counter()
+            snapshot.convert(raw, f, codec)
+            save_times.append(time.perf_counter() - start)
+            f.seek(0)
+            start = time.perf_counter()
+            snapshot.decode(f)
+            load_times.append(time.perf_counter() - start)
+        results[codec] = {
+          'bytes': len(f.getvalue()),
+          'save_ms': percentile(sorted(save_times), 0.5) * 1000,
+          'load_ms': percentile(sorted(load_times), 0.5) * 1000,
+        }
+    return results
+
+
+def record_history(game, controller, ticks, samples=20,
+                   memory_cap=float('inf')):
+    """Steps a headless game while recording its Rewind history, without a
+    memory cap by default, and returns a report of the history's size and of
+    the time taken to record snapshots and to restore a sample of them.  The
+    sample always includes the oldest snapshot kept.
+    """
+    history = Rewind(memory_cap=memory_cap)
+    record_times = []
+    for tick in range(ticks):
+        controller(game, tick)
+        game.world.step()
+        if game.deleted:
+            break
+        start = time.perf_counter()
+        history.record(game)
+        if game.world.ticks % history.interval == 0:
+            record_times.append(time.perf_counter() - start)
+    restore_times = []
+    frames = len(history.frames)
+    # The first restore is slower as it warms up caches, so leave it out.
+    snapshot.read(io.BytesIO(history.decompress(0)), None)
+    for i in range(0, frames, max(frames // samples, 1)):
+        # Rewind.restore forgets the later history, so time what it does
+        # without that.  Collect the games restored so far first, or
+        # collecting them lands in a random sample.
+        gc.collect()
+        start = time.perf_counter()
+        snapshot.read(io.BytesIO(history.decompress(i)), None)
+        restore_times.append(time.perf_counter() - start)
+    record_times.sort()
+    restore_times.sort()
+    seconds = len(record_times) * history.interval * game.world.dt
+    keyframes = sum(frame[1] for frame in history.frames)
+    return {
+      'snapshots': frames,
+      'keyframes': keyframes,
+      'enemies': len(game.enemies),
+      'bytes': history.memory,
+      'bytes_per_second': history.memory / seconds,
+      # Snapshots stored whole because a delta was not smaller, as well as
+      # every keyframe_interval snapshots
+      'keyframe_ratio': keyframes / frames,
+      'record_ms': {
+        'p50': percentile(record_times, 0.5) * 1000,
+        'max': record_times[-1] * 1000,
+      },
+      'restore_ms': {
+        'p50': percentile(restore_times, 0.5) * 1000,
+        'max': restore_times[-1] * 1000,
+      },
+    }
+
+
+@benchmark
+def rewind(ticks=3600, cascade_ticks=60):
+    """Records a Rewind history of Level 1, as in level1, and of a late
+    Level 3 game whose cascade grows from 100 enemies.  Level 1 is also
+    recorded under a memory cap too small to hold a keyframe and its deltas.
+    """
+    return {
+      'level1': record_history(headless.new_game(difficulty=0),
+                               endless_level1, ticks),
+      'level3': record_history(late_level3(100), cascade, cascade_ticks),
+      # A cap smaller than a keyframe and its deltas, so that the history is
+      # always being cut back to its newest keyframe
+      'level1_capped': record_history(headless.new_game(difficulty=0),
+                                      endless_level1, ticks,
+                                      memory_cap=3000),
+    }
+
+
+def open_window(width, height, fonts=True):
+    """Returns a GameWindow of the given size for the benchmarks which need a
+    display, with the default options and textures loaded.  Set fonts to False
+    to leave fonts to be loaded when first used.
+    """
+    from g.one.game_window import GameWindow
+    Options.options = dict(Options.default_options)
+    # Textures and fonts can only be loaded once there is a GL context.
+    context = pyglet.window.Window(visible=False)
+    Resources.init(sound=False, fonts=fonts)
+    window = GameWindow()
+    context.close()
+    window.set_size(width, height)
+    window.on_resize(width, height)
+    return window
+
+
+def busy_game(window, bullets):
+    """Returns a Game on Level 2 Hard shown in window, which has been played
+    for ten seconds with the bullet count topped up to the given number.  The
+    game is the same every time, and its World is stopped.
+    """
+    from g.one.game import Game
+    random.seed(0)
+    rng = random.Random(0)
+    game = Game(window, True, 1, players=2)
+    game.world.stop()
+    window.change_stage(game)
+    start_at_level(game, 2)
+    for tick in range(600):
+        autopilot(game, tick)
+        for i in range(bullets - len(game.bullets)):
+            pos = (rng.uniform(0, 854), rng.uniform(0, 480))
+            vel = (rng.uniform(-500, 500), rng.uniform(-500, 500))
+            game.bullets.spawn(BOUNCY_BULLET, i % 2 == 0, pos, vel)
+        game.world.step()
+    return game
+
+
+def time_frames(window, frames):
+    """Draws the window's current stage for the given number of frames and
+    returns the mean, median and 99th percentile frame times.  Frame times
+    include waiting for GL to finish, but not the buffer swap.
+    """
+    times = []
+    for frame in range(frames):
+        window.dispatch_events()
+        start = time.perf_counter()
+        window.on_draw()
+        pyglet.gl.glFinish()
+        times.append(time.perf_counter() - start)
+        window.flip()
+    ordered = sorted(times)
+    return {
+      'mean': sum(times) / len(times) * 1000,
+      'p50': percentile(ordered, 0.5) * 1000,
+      'p99': percentile(ordered, 0.99) * 1000,
+    }
+
+
+@benchmark
+@needs_display
+def render_scale(frames=300, width=1920, height=1080, bullets=2000):
+    """Compares the cost of drawing a busy frame to a width x height window at
+    native resolution against drawing it into an offscreen framebuffer at
+    several render scales.  Every scale draws the same frame.
+    """
+    window = open_window(width, height)
+    game = busy_game(window, bullets)
+    results = []
+    for scale in (0, 1, 0.5):
+        window.set_render_scale(scale)
+        results.append({
+          'render_scale': scale,
+          'offscreen': window.framebuffer is not None,
+          'window': [width, height],
+          'enemies': len(game.enemies),
+          'bullets': len(game.bullets),
+          'frame_ms': time_frames(window, frames),
+        })
+    window.close()
+    return results
+
+
+@benchmark
+@needs_display
+def bullet_renderer(frames=300, bullets=5000):
+    """Compares drawing bullets through the batch against one instanced draw
+    call, for the same busy frame.  Each frame interpolates the bullets first,
+    which is when their vertices or instances are written.  With Mesa, set
+    LIBGL_ALWAYS_SOFTWARE=1 to measure software rendering.
+    """
+    from g.one.bullet import BulletEngine
+    window = open_window(854, 480)
+    results = []
+    for instanced in (False, True):
+        BulletEngine.instanced = instanced
+        game = busy_game(window, bullets)
+        results.append({
+          'instanced': game.bullets.renderer is not None,
+          'gl_renderer': pyglet.gl.gl_info.get_renderer(),
+          'enemies': len(game.enemies),
+          'bullets': len(game.bullets),
+          'frame_ms': time_frames(window, frames),
+        })
+    BulletEngine.instanced = False
+    window.close()
+    return results
+
+
+def build_menus(window, repeats):
+    """Times building and deleting every kind of menu, first once and then
+    the given number of times.  Returns the times in milliseconds.
+    """
+    from g.one import menu
+    builders = {
+      'MainMenu': lambda: menu.MainMenu(window),
+      'NewGameMenu': lambda: menu.NewGameMenu(window),
+      'LoadGameMenu': lambda: menu.LoadGameMenu(window),
+      'HighscoresMenu': lambda: menu.HighscoresMenu(window),
+      'OptionsMenu': lambda: menu.OptionsMenu(window),
+      'ControlsMenu': lambda: menu.ControlsMenu(window),
+      'GameOverMenu': lambda: menu.GameOverMenu(window, 0, 0, True),
+    }
+    results = {}
+    for name, build in builders.items():
+        times = []
+        for i in range(repeats + 1):
+            start = time.perf_counter()
+            build().delete()
+            times.append(time.perf_counter() - start)
+        results[name] = {
+          'first_ms': times[0] * 1000,
+          'mean_ms': sum(times[1:]) / repeats * 1000,
+        }
+    return results
+
+
+@benchmark
+@needs_display
+def menus(repeats=20):
+    """Times building every menu with the fonts loaded and their glyphs
+    rendered up front, as the game does.  Compare with menus_cold.
+    """
+    window = open_window(854, 480)
+    results = build_menus(window, repeats)
+    window.close()
+    return results
+
+
+@benchmark
+@needs_display
+def menus_cold(repeats=20):
+    """Times building every menu with the fonts left to be loaded and their
+    glyphs rendered when first used.  Compare with menus.
+    """
+    window = open_window(854, 480, fonts=False)
+    results = build_menus(window, repeats)
+    window.close()
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m g.one.bench',
+                                     description="Runs G-One benchmarks.")
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help="benchmarks to run, default=all of them")
+    parser.add_argument('--list', action='store_true',
+                        help="list the benchmarks and exit")
+    parser.add_argument('--in-process', action='store_true',
+                        help="run every benchmark in this process, so peak "
+                             "memory is shared between them")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in sorted(benchmarks):
+            print(name)
+        return
+    names = args.names or sorted(set(benchmarks) - display_benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            sys.exit("Unknown benchmark: " + name)
+
+    if args.in_process or len(names) == 1:
+        headless.init()
+        results = {name: benchmarks[name]() for name in names}
+    else:
+        results = {}
+        for name in names:
+            output = subprocess.run(
+              [sys.executable, '-m', 'g.one.bench', name],
+              stdout=subprocess.PIPE, check=True
+            ).stdout
+            results.update(json.loads(output.decode()))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -16,113 +16,553 @@
 
 import math
 
+import numpy as np
+import pyglet
+
 from g.one.resources import Resources
-from g.one.sprite import GameSprite
+from g.one.sprite import Box
+from g.one.layers import SPRITES
+from g.one.profiler import Profiler
+from g.one.instancing import InstancedBullets
+
+# The kinds of bullets.  See BulletEngine.
+BULLET = 0
+BOUNCY_BULLET = 1
+HOMING_BULLET = 2
+
+
+def sweep(x0, y0, x1, y1, edges):
+    """Returns an array of the times, from 0 to 1, at which a point moving in a
+    line from (x0, y0) to (x1, y1) first touches each box in edges.  edges is
+    an array of left, right, bottom and top edges, one row per box.  The time
+    is infinite for boxes which are not touched.
+    """
+    enter = np.zeros(len(edges))
+    leave = np.ones(len(edges))
+    for start, end, low, high in ((x0, x1, edges[:, 0], edges[:, 1]),
+                                  (y0, y1, edges[:, 2], edges[:, 3])):
+        delta = end - start
+        if delta == 0:
+            outside = (start < low) | (start > high)
+            enter[outside] = np.inf
+            continue
+        low_time = (low - start) / delta
+        high_time = (high - start) / delta
+        enter = np.maximum(enter, np.minimum(low_time, high_time))
+        leave = np.minimum(leave, np.maximum(low_time, high_time))
+    enter[enter > leave] = np.inf
+    return enter
 
 
-class Bullet(GameSprite):
-    """This is the basic bullet class.
+class BulletEngine():
+    """Simulates and draws all of the bullets belonging to a stage.
 
-    It provides basic functionality of bullets such as movement according to
-    velocity.
+    Bullets are not sprites.  Their state is kept in NumPy arrays with one
+    element per bullet and every tick is a handful of vectorised passes over
+    those arrays.  Live bullets always occupy the first len(self) elements, in
+    the order they were fired.
 
-    Subclass this to provide different types of bullets
+    There are three kinds of bullets:
+
+    BULLET        -- travels in a straight line until it leaves the screen
+    BOUNCY_BULLET -- bounces when it touches the stage boundaries and is
+                     deleted after bouncing 5 times
+    HOMING_BULLET -- heads towards a player when it touches the stage
+                     boundaries and is deleted after doing so 5 times
+
+    Every bullet causes damage upon collision with a sprite of the opposite
+    Earthling status.  Collision is swept: a bullet hits the first sprite its
+    bounding box touches anywhere along the path it moved this tick, so fast
+    bullets cannot pass through ships at low tick rates or after a hitch.
+
+    The engine is also a pool.  Deleted bullets free their slot in the arrays
+    and their quad in the batch, which is hidden and reused by the next bullet
+    fired, so firing allocates nothing unless every slot is in use.  The pool
+    then doubles in size.  Once few enough bullets are left, a pool which has
+    grown past its high-water mark is shrunk back to it.  See stats.
+
+    If BulletEngine.instanced is True and the GL context supports it, bullets
+    are drawn by an InstancedBullets instead, from an InstancedBulletsGroup
+    in the batch's SPRITES layer.
     """
-    def __init__(self, stage, earth, pos, vel):
+    bounces = 5
+    instanced = False
+
+    # The names of the per-bullet arrays
+    arrays = ('pos', 'prev', 'vel', 'half', 'bounces', 'kind', 'earth',
+              'owner')
+
+    def __init__(self, stage, batch=None, capacity=64, high_water=2048):
         """Keyword arguments:
 
-        stage -- the stage this bullet belongs to
+        stage      -- the stage these bullets belong to
+        batch      -- the drawing batch to draw bullets in,
+                      default=stage.batch
+        capacity   -- the number of bullets to allocate space for up front
+        high_water -- the most bullets to keep space for once they are deleted
+        """
+        if batch is None:
+            batch = stage.batch
+        self.stage = stage
+        self.batch = batch
+        self.count = 0
+        self.capacity = 0
+        self.high_water = max(high_water, capacity)
+        self.hits = 0
+        self.misses = 0
+        self.peak = 0
+        self.pos = np.zeros((0, 2))
+        self.prev = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.half = np.zeros((0, 2))
+        self.bounces = np.zeros(0, np.int32)
+        self.kind = np.zeros(0, np.int8)
+        self.earth = np.zeros(0, bool)
+        self.owner = np.zeros(0, bool)
+        self.vertex_lists = {}
+        self.renderer = None
+        self.renderer_list = None
+        self.allocate(capacity)
+        self.create_vertex_lists()
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def get_image(earth):
+        """Returns the image used for bullets of the given Earthling status"""
+        if earth:
+            return Resources.earth_bullet_image
+        else:
+            return Resources.alien_bullet_image
+
+    def allocate(self, capacity):
+        """Resizes the arrays to hold the given number of bullets."""
+        for name in BulletEngine.arrays:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+        for earth, vertex_list in self.vertex_lists.items():
+            vertex_list.resize(capacity * 4)
+            self.fill_tex_coords(earth, vertex_list)
+
+    def create_vertex_lists(self):
+        """Adds a vertex list with room for every bullet to the batch for each
+        bullet image, or creates an InstancedBullets if BulletEngine.instanced
+        is True and instancing is supported.  Does nothing if there is no
+        batch.
+        """
+        if self.batch is None:
+            return
+        if BulletEngine.instanced:
+            self.renderer = InstancedBullets.create(
+              [self.get_image(False), self.get_image(True)])
+            if self.renderer is not None:
+                # A batch only draws groups which have vertices.
+                self.renderer_list = self.batch.add(
+                  3, pyglet.gl.GL_TRIANGLES,
+                  InstancedBulletsGroup(self.renderer), 'v2f/static')
+                self.update_vertices()
+                return
+        for earth in (True, False):
+            texture = self.get_image(earth).get_texture()
+            group = pyglet.sprite.SpriteGroup(
+              texture,
+              pyglet.gl.GL_SRC_ALPHA,
+              pyglet.gl.GL_ONE_MINUS_SRC_ALPHA,
+              SPRITES
+            )
+            vertex_list = self.batch.add(
+              self.capacity * 4, pyglet.gl.GL_QUADS, group,
+              'v2f/stream', 'c4B/static', 't3f/static'
+            )
+            self.fill_tex_coords(earth, vertex_list)
+            self.vertex_lists[earth] = vertex_list
+        self.update_vertices()
+
+    def fill_tex_coords(self, earth, vertex_list):
+        tex_coords = self.get_image(earth).get_texture().tex_coords
+        vertex_list.tex_coords[:] = tex_coords * (len(vertex_list.vertices)
+                                                  // 8)
+        vertex_list.colors[:] = (255,) * len(vertex_list.colors)
+
+    def spawn(self, kind, earth, pos, vel):
+        """Fires a new bullet.
+
+        Keyword arguments:
+        kind  -- BULLET, BOUNCY_BULLET or HOMING_BULLET
         earth -- True if this bullet is Earthling, otherwise False
         pos   -- tuple of the bullet's initial position
         vel   -- tuple of the bullet's initial velocity
         """
-        GameSprite.__init__(self, stage, earth)
-        stage.bullets.append(self)
-        self.hcenter, self.vcenter = pos
-        self.vel = vel
-        self.belong_to_player = earth == stage.earth
-
-    def get_image(self):
-        if self.earth:
-            return Resources.earth_bullet_image
+        if self.count == self.capacity:
+            self.misses += 1
+            self.allocate(max(self.capacity * 2, 1))
         else:
-            return Resources.alien_bullet_image
+            self.hits += 1
+        i = self.count
+        image = self.get_image(earth)
+        self.pos[i] = pos
+        self.prev[i] = pos
+        self.vel[i] = vel
+        self.half[i] = (image.width/2, image.height/2)
+        self.bounces[i] = 0 if kind == BULLET else BulletEngine.bounces
+        self.kind[i] = kind
+        self.earth[i] = earth
+        self.owner[i] = earth == self.stage.earth
+        self.count += 1
+        self.peak = max(self.peak, self.count)
 
-    def update(self, dt):
-        """Moves the bullet according to the current velocity and causes damage
-        upon collision with a sprite of the opposite Earthling status.
+    def stats(self):
+        """Returns a dict of pool statistics for sizing the pool:
+
+        live       -- the number of bullets alive now
+        capacity   -- the number of bullets there is space for
+        high_water -- the capacity the pool shrinks back to
+        peak       -- the most bullets which have been alive at once
+        hits       -- the number of bullets fired into a free slot
+        misses     -- the number of bullets which caused the pool to grow
+        """
+        return {
+          'live': self.count,
+          'capacity': self.capacity,
+          'high_water': self.high_water,
+          'peak': self.peak,
+          'hits': self.hits,
+          'misses': self.misses,
+        }
 
-        Override this method when subclassing but call it at the END of the
-        overriding method.
+    def update(self, dt):
+        """Called once per World tick.  Moves every bullet, handles bouncing
+        and homing, causes damage upon collision and deletes bullets which
+        have hit something, run out of bounces or left the screen.
         """
+        n = self.count
+        if n == 0:
+            return
+        pos = self.pos[:n]
+        vel = self.vel[:n]
+        bounces = self.bounces[:n]
+        kind = self.kind[:n]
+
+        walls = kind != BULLET
+        dead = np.zeros(n, bool)
+        homing = np.zeros(n, bool)
+        if walls.any():
+            touched_x, touched_y = self.keep_onscreen(walls)
+
+            bouncy = kind == BOUNCY_BULLET
+            vel[bouncy & touched_x, 0] *= -1
+            vel[bouncy & touched_y, 1] *= -1
+            bounces[bouncy & (touched_x | touched_y)] -= 1
+            dead |= walls & (bounces <= 0)
+
+            # Homing bullets pick their target in turn during collide, as
+            # hits before theirs may change which target that is.
+            homing = (kind == HOMING_BULLET) & (touched_x | touched_y)
+            dead &= ~homing
+
+        self.prev[:n] = pos
+        if homing.any():
+            pos[~homing] += vel[~homing] * dt
+        else:
+            pos += vel * dt
+
+        start = Profiler.start()
+        self.collide(dt, dead, homing)
+        Profiler.stop('collision', start)
         if self.stage.deleted:
-            self.delete()
             return
-        self.x += self.vel[0] * dt
-        self.y += self.vel[1] * dt
-        if self.belong_to_player:
-            collision = self.collide_once(self.stage.enemies)
+        dead |= ~self.onscreen()
+        self.remove(dead)
+
+    def edges(self):
+        """Returns the left, right, bottom and top edges of the live bullets
+        as arrays.
+        """
+        n = self.count
+        x, y = self.pos[:n].T
+        half_width, half_height = self.half[:n].T
+        return (x - half_width, x + half_width,
+                y - half_height, y + half_height)
+
+    def swept_edges(self):
+        """Returns the left, right, bottom and top edges of the area each live
+        bullet covered while moving this tick, as arrays.
+        """
+        n = self.count
+        x = self.pos[:n, 0]
+        y = self.pos[:n, 1]
+        prev_x = self.prev[:n, 0]
+        prev_y = self.prev[:n, 1]
+        half_width, half_height = self.half[:n].T
+        return (np.minimum(x, prev_x) - half_width,
+                np.maximum(x, prev_x) + half_width,
+                np.minimum(y, prev_y) - half_height,
+                np.maximum(y, prev_y) + half_height)
+
+    def onscreen(self):
+        """Returns a mask of the live bullets which are at least partially
+        onscreen.
+        """
+        left, right, bottom, top = self.edges()
+        return ~((right < 0) | (left > 854) | (top < 0) | (bottom > 480))
+
+    def keep_onscreen(self, mask):
+        """Moves the masked bullets entirely onscreen.  Returns two masks of
+        the bullets which were horizontally and vertically offscreen.
+        """
+        n = self.count
+        pos = self.pos[:n]
+        half = self.half[:n]
+        touched = []
+        for axis, size in enumerate((854, 480)):
+            low = mask & (pos[:, axis] - half[:, axis] < 0)
+            pos[low, axis] = half[low, axis]
+            high = mask & (pos[:, axis] + half[:, axis] > size)
+            pos[high, axis] = size - half[high, axis]
+            touched.append(low | high)
+        return touched
+
+    def retarget(self, i):
+        """Points bullet i towards the next target, keeping its speed."""
+        dx, dy = self.vel[i]
+        magnitude = math.sqrt(dx*dx + dy*dy)
+        target = self.stage.get_target()
+        x = target.hcenter - self.pos[i, 0]
+        y = target.vcenter - self.pos[i, 1]
+        distance = math.sqrt(x*x + y*y)
+        self.vel[i] = (x / distance * magnitude, y / distance * magnitude)
+
+    def first_hit(self, i):
+        """Returns the sprite bullet i hit first while moving this tick, or
+        None.  Sprites hit at the same time are ordered as in their
+        SpatialHash.
+        """
+        x0, y0 = self.prev[i]
+        x1, y1 = self.pos[i]
+        half_width, half_height = self.half[i]
+        swept = Box(min(x0, x1) - half_width, max(x0, x1) + half_width,
+                    min(y0, y1) - half_height, max(y0, y1) + half_height)
+        sprites = self.targets(i).query(swept)
+        if not sprites:
+            return None
+        # Sweeping the bullet's box along its path is the same as sweeping
+        # its center along the path against each sprite grown by its size.
+        edges = np.array([(s.left - half_width, s.right + half_width,
+                           s.bottom - half_height, s.top + half_height)
+                          for s in sprites])
+        times = sweep(x0, y0, x1, y1, edges)
+        first = np.argmin(times)
+        if times[first] == np.inf:
+            return None
+        return sprites[first]
+
+    def targets(self, i):
+        """Returns the SpatialHash of sprites bullet i can hit."""
+        if self.owner[i]:
+            return self.stage.enemy_index
         else:
-            collision = self.collide_once(self.stage.players)
-        if collision is not None:
+            return self.stage.player_index
+
+    def candidates(self, mask):
+        """Returns the indices of the masked bullets which may have hit a
+        sprite they can hit, in order.  The area each bullet covered this tick
+        is tested, so this finds every hit and some misses.
+        """
+        left, right, bottom, top = self.swept_edges()
+        found = np.zeros(self.count, bool)
+        for owner, index in ((True, self.stage.enemy_index),
+                             (False, self.stage.player_index)):
+            bullets = mask & (self.owner[:self.count] == owner)
+            if not bullets.any() or not len(index):
+                continue
+            edges = np.array([(s.left, s.right, s.bottom, s.top)
+                              for s in index.entries])
+            i = np.flatnonzero(bullets)
+            overlap = ~((left[i, None] > edges[None, :, 1]) |
+                        (right[i, None] < edges[None, :, 0]) |
+                        (top[i, None] < edges[None, :, 2]) |
+                        (bottom[i, None] > edges[None, :, 3]))
+            found[i] = overlap.any(axis=1)
+        return np.flatnonzero(found)
+
+    def collide(self, dt, dead, homing):
+        """Causes damage for every live bullet touching a sprite it can hit
+        and marks those bullets as dead.  Also retargets and moves the homing
+        bullets in the homing mask.
+
+        Potential hits are found with a vectorised test, then resolved one
+        bullet at a time in firing order against the stage's SpatialHashes,
+        exactly as if each bullet had been updated on its own.  Hitting a
+        sprite may spawn or move sprites, in which case the remaining bullets
+        are tested again.
+        """
+        stage = self.stage
+        indexes = (stage.enemy_index, stage.player_index)
+        versions = [index.version for index in indexes]
+        pending = np.union1d(self.candidates(~dead & ~homing),
+                             np.flatnonzero(homing))
+        j = 0
+        while j < len(pending):
+            i = pending[j]
+            j += 1
+            if dead[i]:
+                continue
+            if homing[i]:
+                homing[i] = False
+                self.retarget(i)
+                self.bounces[i] -= 1
+                if self.bounces[i] <= 0:
+                    dead[i] = True
+                    continue
+                self.pos[i] += self.vel[i] * dt
+            collision = self.first_hit(i)
+            if collision is None:
+                continue
             collision.hit()
-            if not self.stage.deleted:
-                self.delete()
+            dead[i] = True
+            if stage.deleted:
+                return
+            if versions != [index.version for index in indexes]:
+                versions = [index.version for index in indexes]
+                later = ~dead & ~homing
+                later[:i+1] = False
+                pending = np.union1d(self.candidates(later),
+                                     np.flatnonzero(homing))
+                j = 0
+
+    def remove(self, dead):
+        """Deletes the masked bullets, keeping the rest in order."""
+        n = self.count
+        if not dead.any():
             return
+        keep = np.flatnonzero(~dead)
+        # Bullets fired after the mask was made are kept too.
+        keep = np.concatenate((keep, np.arange(n, self.count)))
+        for name in BulletEngine.arrays:
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        self.count = len(keep)
+        if (self.capacity > self.high_water and
+                self.count <= self.high_water // 2):
+            self.allocate(self.high_water)
 
-        if not self.onscreen():
-            self.delete()
+    def update_vertices(self, alpha=1):
+        """Writes the quad of every live bullet straight into the batch.
+        Unused quads are collapsed to a point.  With an InstancedBullets, the
+        bullets are uploaded as its instances instead.
+
+        Each bullet is drawn alpha of the way from where it was before the
+        last tick to where it is now.
+        """
+        if not self.vertex_lists and self.renderer is None:
+            return
+        n = self.count
+        prev = self.prev[:n]
+        x, y = (prev + (self.pos[:n] - prev) * alpha).T
+        vx, vy = self.vel[:n].T
+        speed = np.hypot(vx, vy)
+        moving = speed > 0
+        # Bullets are rotated to face their direction of travel.  These are
+        # the cosine and sine of that rotation, as used by pyglet's Sprite.
+        cr = np.where(moving, vy / np.where(moving, speed, 1), 0)
+        sr = np.where(moving, -vx / np.where(moving, speed, 1), -1)
+        if self.renderer is not None:
+            self.renderer.update(np.column_stack((x, y, cr, sr,
+                                                  self.earth[:n])))
+            return
+        for earth, vertex_list in self.vertex_lists.items():
+            image = self.get_image(earth)
+            x1 = -(image.width // 2)
+            y1 = -(image.height // 2)
+            x2 = x1 + image.width
+            y2 = y1 + image.height
+            mine = self.earth[:n] == earth
+            vertices = np.ctypeslib.as_array(vertex_list.vertices)
+            vertices = vertices.reshape(-1, 8)
+            vertices[:] = 0
+            quads = vertices[:n]
+            for corner, (cx, cy) in enumerate(((x1, y1), (x2, y1),
+                                               (x2, y2), (x1, y2))):
+                quads[mine, corner*2] = (cx * cr - cy * sr + x)[mine]
+                quads[mine, corner*2+1] = (cx * sr + cy * cr + y)[mine]
+
+    def clear(self):
+        """Deletes every bullet."""
+        self.count = 0
+        self.update_vertices()
 
     def delete(self):
-        """Called when the bullet is to be deleted.
+        """Call this when the stage is deleted to free the vertex lists."""
+        self.count = 0
+        for vertex_list in self.vertex_lists.values():
+            vertex_list.delete()
+        self.vertex_lists = {}
+        if self.renderer is not None:
+            self.renderer_list.delete()
+            self.renderer_list = None
+            self.renderer.delete()
+            self.renderer = None
 
-        Informs the stage that the bullet is to be deleted from the bullet list
-        and then runs GameSprite's delete method.
+    @classmethod
+    def from_legacy(cls, stage, batch, bullets):
+        """Returns a BulletEngine holding the given legacy Bullets, which
+        were loaded from an old savestate.
         """
-        self.stage.delete_bullet(self)
-        GameSprite.delete(self)
+        engine = cls(stage, batch, max(len(bullets), 1))
+        for bullet in bullets:
+            engine.spawn(bullet.kind, bullet.earth, (bullet._x, bullet._y),
+                         bullet._vel)
+            if bullet.kind != BULLET:
+                engine.bounces[engine.count-1] = bullet.bounces
+        engine.update_vertices()
+        return engine
 
-    @property
-    def vel(self):
-        return self._vel
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['vertex_lists']
+        state.pop('renderer', None)
+        state.pop('renderer_list', None)
+        return state
 
-    @vel.setter
-    def vel(self, value):
-        self._vel = value
-        self.rotation = 90 - math.degrees(math.atan2(value[1], value[0]))
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.vertex_lists = {}
+        self.renderer = None
+        self.renderer_list = None
+        self.create_vertex_lists()
 
 
-class BouncyBullet(Bullet):
-    """This bullet bounces when it touches the stage boundaries."""
-    def __init__(self, *args):
-        Bullet.__init__(self, *args)
-        self.bounces = 5
+class InstancedBulletsGroup(pyglet.graphics.Group):
+    """A group in the SPRITES layer which draws an InstancedBullets when the
+    batch sets its state, so that the bullets are drawn in order with the rest
+    of the batch.  Its only vertices are an empty triangle.
+    """
+    def __init__(self, renderer):
+        pyglet.graphics.Group.__init__(self, SPRITES)
+        self.renderer = renderer
 
-    def update(self, dt):
-        if self.bounce():
-            self.bounces -= 1
-        if self.bounces <= 0:
-            # Delete the bullet once it has bounces 5 times.
-            self.delete()
-            return
-        Bullet.update(self, dt)
+    def set_state(self):
+        self.renderer.draw()
 
 
-class HomingBullet(Bullet):
-    """This bullet bounces towards a player when it collides with walls."""
-    def __init__(self, *args):
-        Bullet.__init__(self, *args)
-        self.bounces = 5
+class Bullet():
+    """Savestates from before the BulletEngine pickled every bullet as a
+    sprite of this class or a subclass.  These classes are only used to load
+    those savestates; see BulletEngine.from_legacy.
+    """
+    kind = BULLET
 
-    def update(self, dt):
-        if self.keep_onscreen():
-            dx, dy = self.vel
-            magnitude = math.sqrt(dx*dx + dy*dy)
-            dx, dy = self.direction_to_sprite(self.stage.get_target())
-            self.vel = tuple(x*magnitude for x in (dx, dy))
-            self.bounces -= 1
-        if self.bounces <= 0:
-            # Delete the bullet once it has bounces 5 times.
-            self.delete()
-            return
-        Bullet.update(self, dt)
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class BouncyBullet(Bullet):
+    kind = BOUNCY_BULLET
+
+
+class HomingBullet(Bullet):
+    kind = HOMING_BULLET
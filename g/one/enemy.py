@@ -19,7 +19,6 @@ import math
 from g.one.resources import Resources
 from g.one.sprite import GameSprite
 from g.one.bullet import *
-from g.one.sound_effect import SoundEffect
 
 
 class Enemy(GameSprite):
@@ -50,7 +49,7 @@ class Enemy(GameSprite):
         return Resources.ship_image
 
     def update(self, dt):
-        """Update method called every (1/60) seconds.  Makes the enemy move
+        """Update method called once per World tick.  Makes the enemy move
         according to velocity, bounce if it touches the edge of the screen and
         cause mutual damage if it touches a player.
 
@@ -60,7 +59,7 @@ class Enemy(GameSprite):
         self.x += self.vel[0] * dt
         self.y += self.vel[1] * dt
         self.bounce()
-        collision = self.collide_once(self.stage.players)
+        collision = self.collide_once(self.stage.player_index)
         if collision is not None:
             self.hit()
             collision.hit()
@@ -75,7 +74,7 @@ class Enemy(GameSprite):
         self.health -= 1
         self.stage.score += 1
         if self.health <= 0:
-            SoundEffect(Resources.explosion_sound)
+            self.stage.play_sound(Resources.explosion_sound)
             self.delete()
 
     def delete(self):
@@ -109,9 +108,11 @@ class BasicEnemy(Enemy):
                   500*x for x in
                   self.direction_to_sprite(self.stage.get_target())
                 )
-                BouncyBullet(self.stage, self.earth, bullet_pos, bullet_vel)
+                self.stage.bullets.spawn(BOUNCY_BULLET, self.earth,
+                                         bullet_pos, bullet_vel)
             else:
-                Bullet(self.stage, self.earth, bullet_pos, (0, -500))
+                self.stage.bullets.spawn(BULLET, self.earth, bullet_pos,
+                                         (0, -500))
         Enemy.update(self, dt)
 
 
@@ -131,7 +132,8 @@ class HorizontalTrackerEnemy(Enemy):
         if self.cooldown <= 0 and self.stage.difficulty == 1:
             self.cooldown = 0.8
             bullet_pos = (self.hcenter, self.vcenter)
-            Bullet(self.stage, self.earth, bullet_pos, (0, -500))
+            self.stage.bullets.spawn(BULLET, self.earth, bullet_pos,
+                                     (0, -500))
 
     def get_image(self):
         if self.earth:
@@ -150,7 +152,8 @@ class SplitterEnemy(Enemy):
         if self.cooldown <= 0:
             self.cooldown = 0.8
             bullet_pos = (self.hcenter, self.vcenter)
-            Bullet(self.stage, self.earth, bullet_pos, (0, -500))
+            self.stage.bullets.spawn(BULLET, self.earth, bullet_pos,
+                                     (0, -500))
         Enemy.update(self, dt)
 
     def hit(self):
@@ -159,13 +162,13 @@ class SplitterEnemy(Enemy):
         if self.health <= 0:
             new_vel = (-self.vel[1], self.vel[0])
             new_enemy = SplitterEnemy(self.stage, (self.x, self.y), new_vel)
-            self.stage.enemies.append(new_enemy)
+            self.stage.add_enemy(new_enemy)
 
             new_vel = (self.vel[1], -self.vel[0])
             new_enemy = SplitterEnemy(self.stage, (self.x, self.y), new_vel)
-            self.stage.enemies.append(new_enemy)
+            self.stage.add_enemy(new_enemy)
 
-            SoundEffect(Resources.explosion_sound)
+            self.stage.play_sound(Resources.explosion_sound)
             self.delete()
 
     def get_image(self):
@@ -0,0 +1,91 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from ctypes import byref
+
+import pyglet
+from pyglet import gl
+
+
+class Framebuffer():
+    """An offscreen framebuffer whose colour buffer is a texture.
+
+    Stages are drawn into the framebuffer at a fixed resolution, which is then
+    presented to the window with one scaled blit.  The cost of drawing the
+    stage is then independent of the window's size.
+    """
+    def __init__(self, width, height):
+        """Use Framebuffer.create instead, which checks that framebuffers are
+        supported.
+        """
+        self.width = width
+        self.height = height
+        self.texture = pyglet.image.Texture.create(width, height)
+        self.id = gl.GLuint()
+        gl.glGenFramebuffersEXT(1, byref(self.id))
+        gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT, self.id)
+        gl.glFramebufferTexture2DEXT(gl.GL_FRAMEBUFFER_EXT,
+                                     gl.GL_COLOR_ATTACHMENT0_EXT,
+                                     self.texture.target, self.texture.id, 0)
+        self.status = gl.glCheckFramebufferStatusEXT(gl.GL_FRAMEBUFFER_EXT)
+        gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT, 0)
+
+    @classmethod
+    def create(cls, width, height):
+        """Returns a new Framebuffer of the given size, or None if offscreen
+        framebuffers are not supported by the current GL context.
+        """
+        if not gl.gl_info.have_extension('GL_EXT_framebuffer_object'):
+            return None
+        framebuffer = cls(width, height)
+        if framebuffer.status != gl.GL_FRAMEBUFFER_COMPLETE_EXT:
+            framebuffer.delete()
+            return None
+        return framebuffer
+
+    def bind(self):
+        """Directs drawing into the framebuffer.  The game's 854x480 drawing
+        area covers the whole framebuffer.
+        """
+        gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT, self.id)
+        gl.glViewport(0, 0, self.width, self.height)
+        set_projection(854, 480)
+
+    def unbind(self):
+        """Directs drawing back to the window."""
+        gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT, 0)
+
+    def present(self, window, viewport):
+        """Draws the framebuffer's contents onto the window, scaled to fill
+        viewport, which is a tuple of x, y, width and height in pixels.
+        """
+        gl.glViewport(0, 0, window.width, window.height)
+        set_projection(window.width, window.height)
+        x, y, width, height = viewport
+        self.texture.blit(x, y, width=width, height=height)
+
+    def delete(self):
+        """Frees the framebuffer and its texture."""
+        gl.glDeleteFramebuffersEXT(1, byref(self.id))
+        self.texture.delete()
+
+
+def set_projection(width, height):
+    """Maps a drawing area of the given size onto the current viewport."""
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glLoadIdentity()
+    gl.glOrtho(0, width, 0, height, -1, 1)
+    gl.glMatrixMode(gl.GL_MODELVIEW)
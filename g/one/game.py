@@ -20,39 +20,57 @@ from pyglet.window import key
 from g.one.pause_menu import PauseMenu
 from g.one.player import Player
 from g.one.enemy import Enemy
+from g.one.bullet import BulletEngine
 from g.one.resources import Resources
 from g.one.options import Options
 from g.one.healthbar import Healthbar
+from g.one.background import Background
+from g.one.hud import Hud
 from g.one.background_music import BackgroundMusic
+from g.one.sound_effect import SoundEffect
+from g.one.world import World
+from g.one.spatial_hash import SpatialHash
+from g.one.registry import Registry
+from g.one.rewind import Rewind
+from g.one.profiler import Profiler, ProfilerOverlay, batch_draw_calls
 from g.one.spawner import *
 
 
 class Game(pyglet.event.EventDispatcher):
-    """The game class is a stage that controls all of the game logic."""
+    """The game class is a stage that controls all of the game logic.
+
+    A Game created without a window is headless.  A headless Game has no
+    drawing batch, labels, healthbars, music or sound effects and its World is
+    never scheduled, so it can run without a display or audio device.  Step it
+    by calling self.world.step() and give input with Player.on_key.  See
+    g.one.headless.
+    """
 
     spawners = [Level1Spawner, Level2Spawner, Level3Spawner]
+    persistent = False
 
     def __init__(self, window, earth, difficulty, players=1):
         """Keyword arguments:
 
-        window     -- The window this stage belongs to
+        window     -- The window this stage belongs to, or None to be headless
         earth      -- True if the player is Earthling, otherwise false
         difficulty -- 0 for "Normal" difficulty, 1 for "Hard
         players    -- The number of players. Currently, only 1 or 2 is accepted
         """
-        window.push_handlers(self)
-        pyglet.clock.schedule_interval(self.update, 1/30)
-        BackgroundMusic.play(Resources.game_music)
-
         self.window = window
         self.earth = earth
         self.difficulty = difficulty
+        if not self.headless:
+            window.push_handlers(self)
+            BackgroundMusic.play(Resources.game_music)
 
         self.deleted = False
         self.pause_menu = None
-        self.batch = pyglet.graphics.Batch()
-        self.enemies = []
-        self.bullets = []
+        self.profiler_overlay = None
+        self.batch = None if self.headless else pyglet.graphics.Batch()
+        self.enemies = Registry()
+        self.bullets = BulletEngine(self)
+        self.enemy_index = SpatialHash()
         self.spawner = None
         self.win = False
         self.__target = -1
@@ -60,10 +78,11 @@ class Game(pyglet.event.EventDispatcher):
         self.players = []
         for i in range(1, players+1):
             self.players.append(Player(self, self.earth, i))
+        self.player_index = SpatialHash()
+        self.player_index.rebuild(self.players)
 
-        self.healthbars = []
-        for i, e in enumerate(self.players):
-            self.healthbars.append(Healthbar(e, 15 * i))
+        self.create_healthbars()
+        self.create_background()
 
         self.initialise_text()
         self.status = ""
@@ -71,43 +90,31 @@ class Game(pyglet.event.EventDispatcher):
         self.lives = 3
         self.level = 0
 
+        self.world = World(self)
+        self.rewind = Rewind.create()
+        if not self.headless:
+            self.world.start()
+
+    def create_background(self):
+        """Adds the background to the drawing batch.  Headless Games have no
+        background.
+        """
+        self.background = None if self.headless else Background(self.batch)
+
+    def create_healthbars(self):
+        """Creates a healthbar in the drawing batch for each player.  Headless
+        Games have no healthbars.
+        """
+        self.healthbars = []
+        if not self.headless:
+            for i, player in enumerate(self.players):
+                self.healthbars.append(Healthbar(player, self.batch, 15 * i))
+
     def initialise_text(self):
-        """Initialises the labels which will be displayed to screen"""
-        self.status_label = pyglet.text.Label(
-          '',
-          font_name='Times New Roman',
-          font_size=16,
-          x=427, y=480,
-          color=(255, 255, 255, 255),
-          anchor_x='center', anchor_y='top'
-        )
-
-        self.score_label = pyglet.text.Label(
-          '',
-          font_name='Times New Roman',
-          font_size=16,
-          x=0, y=480,
-          color=(255, 255, 255, 255),
-          anchor_x='left', anchor_y='top'
-        )
-
-        self.lives_label = pyglet.text.Label(
-          '',
-          font_name='Times New Roman',
-          font_size=16,
-          x=0, y=460,
-          color=(255, 255, 255, 255),
-          anchor_x='left', anchor_y='top'
-        )
-
-        self.level_label = pyglet.text.Label(
-          '',
-          font_name='Times New Roman',
-          font_size=16,
-          x=854, y=480,
-          color=(255, 255, 255, 255),
-          anchor_x='right', anchor_y='top'
-        )
+        """Initialises the HUD which will be displayed to screen.  Headless
+        Games have no HUD.
+        """
+        self.hud = None if self.headless else Hud()
 
     def draw(self):
         """Draws the sprites to the screen or draws the pause menu if the game
@@ -116,19 +123,31 @@ class Game(pyglet.event.EventDispatcher):
         if self.paused:
             self.pause_menu.draw()
         else:
-            Resources.space_image.blit(0, 0)
-            self.batch.draw()
+            draw_start = Profiler.start()
+            start = Profiler.start()
+            self.world.interpolate()
+            Profiler.stop('interpolate', start)
             for healthbar in self.healthbars:
-                healthbar.draw()
-            self.status_label.draw()
-            self.score_label.draw()
-            self.lives_label.draw()
-            self.level_label.draw()
+                healthbar.update()
+            start = Profiler.start()
+            self.batch.draw()
+            Profiler.stop('batch draw', start)
+            start = Profiler.start()
+            self.hud.draw()
+            Profiler.stop('hud', start)
+            Profiler.stop('draw', draw_start)
+            if Profiler.enabled:
+                Profiler.count('batch draw calls',
+                               batch_draw_calls(self.batch))
+                Profiler.count('sprite textures', Resources.textures())
+                if self.profiler_overlay is None:
+                    self.profiler_overlay = ProfilerOverlay()
+                self.profiler_overlay.draw()
 
     def update(self, dt):
-        """Called every (1/30) seconds for non-graphics logic"""
-        if self.paused:
-            return
+        """Called by the World once per tick, after all of the sprites and the
+        spawner have been updated, for level and status logic.
+        """
         if self.spawner is None and len(self.enemies) == 0:
             self.level += 1
             if self.level <= len(Game.spawners):
@@ -143,18 +162,30 @@ class Game(pyglet.event.EventDispatcher):
             return
 
         if self.spawner is not None:
+            start = Profiler.start()
             spawn = self.spawner.spawn(len(self.enemies))
             if spawn is not None:
-                self.enemies += spawn
+                for enemy in spawn:
+                    self.add_enemy(enemy)
             else:
                 self.spawner = None
+            Profiler.stop('spawner', start)
         if self.status_countdown <= 0:
-            self.status_label.text = ""
+            self._status = ""
+            self.update_label('status', "")
         else:
             self.status_countdown -= dt
+        if self.rewind is not None:
+            self.rewind.record(self)
 
     def game_over(self, win=False):
-        """Ends the game. Set win to True if the player has won."""
+        """Ends the game. Set win to True if the player has won.  A headless
+        Game is simply deleted, leaving self.win set to whether the player won.
+        """
+        if self.headless:
+            self.win = win
+            self.delete()
+            return
         from g.one.menu import GameOverMenu
         self.window.change_stage(GameOverMenu(self.window,
                                               self.score,
@@ -167,7 +198,13 @@ class Game(pyglet.event.EventDispatcher):
         if self.paused:
             return
         if symbol == key.ESCAPE:
-            self.pause_menu = PauseMenu(self)
+            self.change_pause(PauseMenu(self))
+            return
+        if symbol == key.F3:
+            Profiler.enabled = not Profiler.enabled
+            return
+        if symbol == key.BACKSPACE and self.rewind is not None:
+            self.rewind_by(1)
             return
         for i, player in enumerate(self.players):
             for k, v in Options.options['controls'][i].items():
@@ -186,51 +223,94 @@ class Game(pyglet.event.EventDispatcher):
                     return
 
     def change_pause(self, pause_menu):
-        """Changes the pause menu and deletes the old pause menu"""
+        """Changes the pause menu and deletes the old pause menu.  The World
+        is stopped while there is a pause menu.
+        """
         if self.pause_menu is not None:
             self.pause_menu.delete()
         self.pause_menu = pause_menu
+        if self.paused or self.deleted or self.headless:
+            self.world.stop()
+        else:
+            self.world.start()
+
+    def rewind_by(self, seconds):
+        """Replaces this Game with the Game as it was the given number of
+        seconds ago, or as long ago as its Rewind goes back.  Does nothing if
+        nothing has been recorded yet.
+        """
+        if not self.rewind.frames:
+            return
+        ticks = self.world.ticks - round(seconds / self.world.dt)
+        self.window.change_stage(self.rewind.restore(ticks, self.window))
 
     def exit(self):
         """Exits to the main menu"""
         from g.one.menu import MainMenu
-        self.window.change_stage(MainMenu(self.window))
+        self.window.change_stage(self.window.stage(MainMenu))
 
     def delete(self):
         """Called when the Game is to be deleted.
 
-        Clears sprite lists and unschedules the update method."""
+        Clears sprite lists and stops the World."""
         self.deleted = True
-        self.window.remove_handlers(self)
-        pyglet.clock.unschedule(self.update)
+        if not self.headless:
+            self.window.remove_handlers(self)
         self.change_pause(None)
         for player in self.players:
             player.delete()
         del self.players
-        while self.enemies:
-            self.enemies[0].delete()
+        for enemy in self.enemies:
+            enemy.delete()
         del self.enemies
-        while self.bullets:
-            self.bullets[0].delete()
+        self.bullets.delete()
         del self.bullets
         try:
             while True:
                 self.pop_handlers()
         except AssertionError:
             pass
+        for healthbar in self.healthbars:
+            healthbar.delete()
         del self.healthbars
+        if self.background is not None:
+            self.background.delete()
+        if self.hud is not None:
+            self.hud.delete()
 
     @property
     def paused(self):
         return self.pause_menu is not None
 
+    @property
+    def animated(self):
+        """The game is only redrawn continuously while it is not paused"""
+        return not self.paused
+
+    @property
+    def headless(self):
+        return self.window is None
+
+    def update_label(self, name, value):
+        """Sets the value shown by the named HUD field, unless headless.  The
+        text is only laid out when the HUD is next drawn.
+        """
+        if self.hud is not None:
+            self.hud.set(name, value)
+
+    def play_sound(self, sound):
+        """Plays a sound effect, unless headless"""
+        if not self.headless:
+            SoundEffect(sound)
+
     @property
     def status(self):
-        return self.status_label.text
+        return self._status
 
     @status.setter
     def status(self, value):
-        self.status_label.text = value
+        self._status = value
+        self.update_label('status', value)
         self.status_countdown = 3
 
     @property
@@ -240,7 +320,7 @@ class Game(pyglet.event.EventDispatcher):
     @score.setter
     def score(self, value):
         self._score = value
-        self.score_label.text = 'Score: ' + str(value)
+        self.update_label('score', value)
         if value >= 400 and self.level == 3:
             self.win = True
 
@@ -251,7 +331,7 @@ class Game(pyglet.event.EventDispatcher):
     @lives.setter
     def lives(self, value):
         self._lives = value
-        self.lives_label.text = 'Lives: ' + str(value)
+        self.update_label('lives', value)
         if value <= 0:
             self.game_over()
 
@@ -262,7 +342,7 @@ class Game(pyglet.event.EventDispatcher):
     @level.setter
     def level(self, value):
         self._level = value
-        self.level_label.text = "Level: " + str(value)
+        self.update_label('level', value)
 
     def get_target(self):
         self.__target = self.__target + 1
@@ -270,33 +350,69 @@ class Game(pyglet.event.EventDispatcher):
             self.__target = 0
         return self.players[self.__target]
 
+    def add_enemy(self, enemy):
+        self.enemies.add(enemy)
+        self.enemy_index.insert(enemy)
+
     def delete_enemy(self, enemy):
         self.enemies.remove(enemy)
-
-    def delete_bullet(self, bullet):
-        self.bullets.remove(bullet)
+        self.enemy_index.remove(enemy)
 
     def __getstate__(self):
         state = self.__dict__.copy()
         del state['pause_menu']
-        del state['score_label']
-        del state['lives_label']
-        del state['status_label']
-        del state['level_label']
-        try:
-            del state['_event_stack']
-        except KeyError:
-            pass
+        del state['profiler_overlay']
+        del state['player_index']
+        del state['enemy_index']
+        for name in ('hud', 'healthbars', 'background', '_event_stack',
+                     'rewind'):
+            state.pop(name, None)
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        if 'world' not in state:
+            # Savestates from before the World was introduced
+            self.world = World(self)
+        if isinstance(self.enemies, list):
+            # Savestates from before the Registry
+            self.enemies = Registry(self.enemies)
+        if isinstance(self.bullets, list):
+            # Savestates from before the BulletEngine
+            self.bullets = BulletEngine.from_legacy(self, self.batch,
+                                                    self.bullets)
+        if '_status' not in state:
+            # Savestates from before headless Games
+            self._status = ""
+        self.rebuild()
+
+    def rebuild(self):
+        """Recreates everything a savestate leaves out, such as the spatial
+        indexes and the HUD, once the rest of the Game has been loaded.  Then
+        resumes the Game unless it is headless.
+        """
         pyglet.event.EventDispatcher.__init__(self)
-        pyglet.clock.schedule_interval(self.update, 1/30)
-        self.window.push_handlers(self)
+        self.player_index = SpatialHash()
+        self.player_index.rebuild(self.players)
+        self.enemy_index = SpatialHash()
+        self.enemy_index.rebuild(sorted(self.enemies,
+                                        key=self.enemies.handle))
         self.pause_menu = None
+        self.profiler_overlay = None
+        # The simulation rate is a setting, not part of the game, so a game
+        # saved at another rate is played at the current one.
+        self.world.dt = 1 / World.rate
+        self.rewind = Rewind.create()
+        # Healthbars are not saved.  Any in savestates from before then are
+        # replaced.
+        self.create_healthbars()
+        self.create_background()
         self.initialise_text()
+        self.update_label('status', self._status)
         self.score = self._score
         self.lives = self._lives
         self.level = self._level
-        BackgroundMusic.play(Resources.game_music)
+        if not self.headless:
+            self.window.push_handlers(self)
+            BackgroundMusic.play(Resources.game_music)
+            self.world.start()
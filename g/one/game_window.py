@@ -20,6 +20,7 @@ from pyglet.window import key
 from g.one.resources import Resources
 from g.one.menu import MainMenu
 from g.one.options import Options
+from g.one.framebuffer import Framebuffer, set_projection
 
 
 class GameWindow(pyglet.window.Window):
@@ -30,46 +31,128 @@ class GameWindow(pyglet.window.Window):
     A stage based approach is used for handling the state.  Each menu, gameover
     screen, etc. is a stage which takes full control of input and output.  Each
     stage should provide a draw method which will be called when the window
-    display is to be updated.
+    display is to be updated, and an animated attribute.  Animated stages are
+    redrawn continuously.  Other stages are only redrawn after input, after
+    the window is resized or exposed, or when they call redraw.
+
+    Stages with a true persistent attribute are built once by stage and kept
+    for the lifetime of the window.  Changing away from such a stage only
+    deactivates it, and changing back to it activates it again.  Other stages
+    are deleted when changed away from.
+
+    Stages may be drawn at a fixed resolution into an offscreen framebuffer,
+    according to the 'render scale' option, see set_render_scale.
+
+    The display is redrawn as often as vsync allows, independently of the
+    game's simulation rate.
     """
     def __init__(self):
+        self.viewport = (0, 0, 854, 480)
+        self.framebuffer = None
+        self.render_scale = 0
         pyglet.window.Window.__init__(self, width=854, height=480,
                                       caption="G - One", resizable=True)
-        self.current_stage = MainMenu(self)
+        self.stages = {}
+        self.current_stage = self.stage(MainMenu)
         Options.listeners.append(self.on_options_changed)
         self.on_options_changed()
 
     def on_draw(self):
+        # pyglet's event loop only draws windows which are invalid.
+        self.invalid = self.current_stage.animated
+        if self.framebuffer is None:
+            self.clear()
+            self.current_stage.draw()
+            return
+        self.framebuffer.bind()
         self.clear()
         self.current_stage.draw()
+        self.framebuffer.unbind()
+        self.clear()
+        self.framebuffer.present(self, self.viewport)
+
+    def redraw(self):
+        """Call this when the current stage needs to be redrawn.  Only needed
+        by stages which are not animated.
+        """
+        self.invalid = True
 
     def on_key_press(self, symbol, modifiers):
-        # Remove the default event handler
-        pass
+        # Remove the default event handler.  Input reaches this handler after
+        # the current stage's, and may have changed what it draws.
+        self.redraw()
 
     def on_key_release(self, symbol, modifiers):
         # Remove the default event handler
-        pass
+        self.redraw()
+
+    def on_text(self, text):
+        self.redraw()
+
+    def on_text_motion(self, motion):
+        self.redraw()
+
+    def on_expose(self):
+        self.redraw()
 
     def on_options_changed(self):
         """Event handler for when the options change"""
         self.set_fullscreen(Options.options['fullscreen'])
+        # Options files from before vsync was an option have no 'vsync'.
+        self.set_vsync(Options.options.get('vsync', True))
+        self.set_render_scale(Options.options.get('render scale', 0))
+        self.redraw()
+
+    def stage(self, stage_class):
+        """Returns this window's instance of a persistent stage class, building
+        it the first time.  Pass it to change_stage to show it.
+        """
+        if stage_class not in self.stages:
+            self.stages[stage_class] = stage_class(self)
+        return self.stages[stage_class]
 
     def change_stage(self, newstage):
         """Call this to change to a new stage"""
-        self.current_stage.delete()
+        if self.current_stage.persistent:
+            self.current_stage.deactivate()
+        else:
+            self.current_stage.delete()
         self.current_stage = newstage
+        if newstage.persistent and not newstage.active:
+            newstage.activate()
+        self.redraw()
 
     def on_resize(self, width, height):
         # Math to ensure a 16:9 aspect ratio
         adjwidth = (height * 16) // 9
         adjheight = (width * 9) // 16
         if adjwidth < width:
-            pyglet.gl.glViewport((width-adjwidth)//2, 0, adjwidth, height)
+            self.viewport = ((width-adjwidth)//2, 0, adjwidth, height)
         else:
-            pyglet.gl.glViewport(0, (height-adjheight)//2, width, adjheight)
+            self.viewport = (0, (height-adjheight)//2, width, adjheight)
+        if self.framebuffer is None:
+            self.set_viewport()
+        self.redraw()
+
+    def set_viewport(self):
+        """Letterboxes the game's 854x480 drawing area in the window."""
+        pyglet.gl.glViewport(*self.viewport)
+        set_projection(854, 480)
 
-        pyglet.gl.glMatrixMode(pyglet.gl.GL_PROJECTION)
-        pyglet.gl.glLoadIdentity()
-        pyglet.gl.glOrtho(0, 854, 0, 480, -1, 1)
-        pyglet.gl.glMatrixMode(pyglet.gl.GL_MODELVIEW)
+    def set_render_scale(self, scale):
+        """Draws stages into an offscreen framebuffer of scale times 854x480
+        pixels, which is then scaled to fit the window.  A scale of 0 draws
+        stages directly to the window at its native resolution, as does any
+        scale if framebuffers are not supported.
+        """
+        if scale == self.render_scale:
+            return
+        self.render_scale = scale
+        if self.framebuffer is not None:
+            self.framebuffer.delete()
+            self.framebuffer = None
+        if scale:
+            self.framebuffer = Framebuffer.create(round(854 * scale),
+                                                  round(480 * scale))
+        if self.framebuffer is None:
+            self.set_viewport()
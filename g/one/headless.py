@@ -0,0 +1,63 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Runs games without a window, GL context or audio device.
+
+Import this module before any other G-One module, as pyglet must be told not
+to open a window before its graphics modules are imported:
+
+    from g.one import headless
+    headless.init()
+    game = headless.new_game()
+    game.players[0].on_key(key.SPACE, True)
+    headless.run(game, 3600)
+
+Ticks are stepped back to back, as fast as the CPU allows.
+"""
+
+import pyglet
+
+pyglet.options['shadow_window'] = False
+pyglet.options['audio'] = ('silent',)
+
+from g.one.resources import Resources
+from g.one.game import Game
+
+
+def init():
+    """Call this once before creating any games"""
+    Resources.init(sound=False, atlas=False)
+
+
+def new_game(earth=True, difficulty=0, players=1):
+    """Returns a new headless Game.  The arguments are the same as Game's."""
+    return Game(None, earth, difficulty, players)
+
+
+def run(game, ticks, controller=None):
+    """Steps a headless Game for the given number of ticks or until the game
+    is over, whichever is first.  Returns the number of ticks stepped.
+
+    If provided, controller(game, tick) is called before every tick and may
+    give input to the game, for example with Player.on_key.
+    """
+    for tick in range(ticks):
+        if controller is not None:
+            controller(game, tick)
+        game.world.step()
+        if game.deleted:
+            return tick + 1
+    return ticks
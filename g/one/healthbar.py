@@ -16,45 +16,61 @@
 
 import pyglet
 
+from g.one.layers import OVERLAY
+
 
 class Healthbar():
     """The Healthbar class keeps track of a sprite's health and displays that
     information to the screen visually in the form of a bar.
+
+    The bar is a quad in the game's drawing batch.  Its vertices are only
+    written when update finds that the sprite's health has changed.  Call
+    delete when the healthbar is no longer needed.
     """
-    def __init__(self, sprite, x=0, y=0):
+    def __init__(self, sprite, batch, x=0, y=0):
         """Keyword arguments:
 
         sprite -- the sprite whose health will be displayed by this healthbar
-        x, y   -- the coordinates to the bottom right of this healthbar
+        batch  -- the drawing batch this healthbar belongs to
+        x, y   -- the coordinates to the bottom left of this healthbar
         """
-        self.vlist = pyglet.graphics.vertex_list(
-                4,
-                ('v2i', (x, 0, x, y, x+10, 0, x+10, y)),
-                ('c3B', (0, 255, 0, 0, 255, 0, 0, 255, 0, 0, 255, 0))
-            )
         self.x = x
         self.y = y
         self.sprite = sprite
+        self.health = sprite.health
+        self.vertex_list = batch.add(
+          4, pyglet.gl.GL_QUADS, OVERLAY,
+          ('v2i/dynamic', self.vertices(self.health)),
+          ('c3B/static', (0, 255, 0) * 4)
+        )
 
-    def draw(self):
-        """Draws the healthbar to screen."""
-        self.set_health(self.sprite.health)
-        # It's faster to draw two triangles than one rectangle.
-        self.vlist.draw(pyglet.gl.GL_TRIANGLE_STRIP)
+    def vertices(self, health):
+        """Returns the vertices of the bar for the provided health."""
+        x = self.x
+        y = self.y
+        return (x, y, x+10, y, x+10, y+health, x, y+health)
 
-    def set_health(self, health):
-        """Updates the size of the healthbar to match the provided health."""
-        self.vlist.vertices[1] = self.y+health
-        self.vlist.vertices[5] = self.y+health
+    def update(self):
+        """Resizes the bar if the sprite's health has changed."""
+        health = self.sprite.health
+        if health != self.health:
+            self.health = health
+            self.vertex_list.vertices[5] = self.y+health
+            self.vertex_list.vertices[7] = self.y+health
+
+    def delete(self):
+        """Frees the vertex list."""
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['vlist']
+        del state['vertex_list']
         return state
 
     def __setstate__(self, state):
-        self.__init__(**state)
-
-    def __del__(self):
-        # Free the vertex list from memory when this healthbar is deleted.
-        self.vlist.delete()
+        # Healthbars are recreated by the Game when it is unpickled.  This is
+        # only used by savestates from before then, which pickled them.
+        self.__dict__.update(state)
+        self.vertex_list = None
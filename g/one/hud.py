@@ -0,0 +1,79 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import pyglet
+
+
+class Hud():
+    """The heads-up display of a Game: its status, score, lives and level.
+
+    Every label lives in one batch, drawn with a single call.  Setting a field
+    only records its new value and marks it dirty.  The text of dirty labels
+    is formatted and laid out when the HUD is next drawn, so a field changed
+    many times in a frame is laid out once, and a field set to the value it
+    already has is not laid out at all.
+    """
+    # name: (format, x, y, anchor_x)
+    fields = {
+      'status': ("{}", 427, 480, 'center'),
+      'score': ("Score: {}", 0, 480, 'left'),
+      'lives': ("Lives: {}", 0, 460, 'left'),
+      'level': ("Level: {}", 854, 480, 'right'),
+    }
+
+    def __init__(self):
+        self.batch = pyglet.graphics.Batch()
+        self.labels = {}
+        self.values = {}
+        self.dirty = set()
+        for name, (form, x, y, anchor_x) in Hud.fields.items():
+            self.labels[name] = pyglet.text.Label(
+              '',
+              font_name='Times New Roman',
+              font_size=16,
+              x=x, y=y,
+              color=(255, 255, 255, 255),
+              anchor_x=anchor_x, anchor_y='top',
+              batch=self.batch
+            )
+
+    def set(self, name, value):
+        """Sets the value shown by the named field"""
+        if name in self.values and self.values[name] == value:
+            return
+        self.values[name] = value
+        self.dirty.add(name)
+
+    def update(self):
+        """Lays out the text of every dirty field"""
+        for name in self.dirty:
+            value = self.values[name]
+            if value == "":
+                text = ""
+            else:
+                text = Hud.fields[name][0].format(value)
+            self.labels[name].text = text
+        self.dirty.clear()
+
+    def draw(self):
+        self.update()
+        self.batch.draw()
+
+    def delete(self):
+        for label in self.labels.values():
+            label.delete()
+        self.labels = {}
+        self.dirty.clear()
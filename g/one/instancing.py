@@ -0,0 +1,198 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from ctypes import byref, c_char, c_char_p, cast, pointer, POINTER
+
+import numpy as np
+from pyglet import gl
+
+
+class InstancedBullets():
+    """Draws bullets with one instanced draw call, as an alternative to
+    writing four vertices per bullet into a batch.
+
+    Each bullet is an instance described by five floats: its position, the
+    cosine and sine of its rotation and the index of its image in the images
+    given on creation.  The quads themselves are built by the vertex shader.
+    Only GLSL 1.20 and the ARB_draw_instanced and ARB_instanced_arrays
+    extensions are used, all of which Mesa's software renderers provide.
+    """
+    vertex_source = b"""
+    #version 120
+    attribute vec2 corner;
+    attribute vec4 instance;
+    attribute float image;
+    uniform vec4 offsets[2];
+    uniform vec4 regions[2];
+    varying vec2 uv;
+
+    void main()
+    {
+        int i = int(image);
+        vec2 local = offsets[i].xy + corner * offsets[i].zw;
+        vec2 rotated = vec2(local.x * instance.z - local.y * instance.w,
+                            local.x * instance.w + local.y * instance.z);
+        gl_Position = gl_ModelViewProjectionMatrix *
+                      vec4(rotated + instance.xy, 0.0, 1.0);
+        uv = mix(regions[i].xy, regions[i].zw, corner);
+    }
+    """
+
+    fragment_source = b"""
+    #version 120
+    uniform sampler2D atlas;
+    varying vec2 uv;
+
+    void main()
+    {
+        gl_FragColor = texture2D(atlas, uv);
+    }
+    """
+
+    # The floats describing each instance
+    stride = 5
+
+    def __init__(self, images):
+        """Use InstancedBullets.create instead, which checks that instancing
+        is supported.
+        """
+        self.texture = images[0].get_texture()
+        self.count = 0
+        self.program = gl.glCreateProgram()
+        for shader_type, source in (
+          (gl.GL_VERTEX_SHADER, InstancedBullets.vertex_source),
+          (gl.GL_FRAGMENT_SHADER, InstancedBullets.fragment_source)):
+            shader = compile_shader(shader_type, source)
+            gl.glAttachShader(self.program, shader)
+            gl.glDeleteShader(shader)
+        # Generic attribute 0 must be an array for anything to be drawn.
+        gl.glBindAttribLocation(self.program, 0, b"corner")
+        gl.glLinkProgram(self.program)
+        linked = gl.GLint()
+        gl.glGetProgramiv(self.program, gl.GL_LINK_STATUS, byref(linked))
+        self.linked = bool(linked.value)
+
+        self.corners, self.instances = gl.GLuint(), gl.GLuint()
+        gl.glGenBuffers(1, byref(self.corners))
+        gl.glGenBuffers(1, byref(self.instances))
+        corners = np.array([0, 0, 1, 0, 0, 1, 1, 1], np.float32)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.corners)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, corners.nbytes,
+                        corners.ctypes.data, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        if not self.linked:
+            return
+
+        self.instance = gl.glGetAttribLocation(self.program, b"instance")
+        self.image = gl.glGetAttribLocation(self.program, b"image")
+        offsets = []
+        regions = []
+        for image in images:
+            x1 = -(image.width // 2)
+            y1 = -(image.height // 2)
+            offsets += [x1, y1, image.width, image.height]
+            tex_coords = image.get_texture().tex_coords
+            regions += [tex_coords[0], tex_coords[1],
+                        tex_coords[6], tex_coords[7]]
+        gl.glUseProgram(self.program)
+        gl.glUniform1i(self.uniform(b"atlas"), 0)
+        gl.glUniform4fv(self.uniform(b"offsets"), len(images),
+                        (gl.GLfloat * len(offsets))(*offsets))
+        gl.glUniform4fv(self.uniform(b"regions"), len(images),
+                        (gl.GLfloat * len(regions))(*regions))
+        gl.glUseProgram(0)
+
+    @classmethod
+    def create(cls, images):
+        """Returns a new InstancedBullets drawing the given images, which must
+        be regions of the same texture, or None if instancing is not
+        supported by the current GL context.
+        """
+        if not (gl.gl_info.have_version(2, 0) and
+                gl.gl_info.have_extension('GL_ARB_draw_instanced') and
+                gl.gl_info.have_extension('GL_ARB_instanced_arrays')):
+            return None
+        if len({image.get_texture().id for image in images}) != 1:
+            return None
+        renderer = cls(images)
+        if not renderer.linked:
+            renderer.delete()
+            return None
+        return renderer
+
+    def uniform(self, name):
+        return gl.glGetUniformLocation(self.program, name)
+
+    def update(self, instances):
+        """Uploads the instances to draw, an array with a row of five floats
+        for each instance.
+        """
+        data = np.ascontiguousarray(instances, np.float32)
+        self.count = len(data)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instances)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data.ctypes.data,
+                        gl.GL_STREAM_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        """Draws every instance last uploaded by update."""
+        if self.count == 0:
+            return
+        size = InstancedBullets.stride * 4
+        gl.glUseProgram(self.program)
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(self.texture.target, self.texture.id)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.corners)
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(0, 2, gl.GL_FLOAT, gl.GL_FALSE, 0, 0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instances)
+        for location, components, offset in ((self.instance, 4, 0),
+                                             (self.image, 1, 16)):
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, components, gl.GL_FLOAT,
+                                     gl.GL_FALSE, size, offset)
+            gl.glVertexAttribDivisorARB(location, 1)
+
+        gl.glDrawArraysInstancedARB(gl.GL_TRIANGLE_STRIP, 0, 4, self.count)
+
+        for location in (self.instance, self.image):
+            gl.glVertexAttribDivisorARB(location, 0)
+            gl.glDisableVertexAttribArray(location)
+        gl.glDisableVertexAttribArray(0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glDisable(gl.GL_BLEND)
+        gl.glUseProgram(0)
+
+    def delete(self):
+        """Frees the shader program and buffers."""
+        gl.glDeleteBuffers(1, byref(self.corners))
+        gl.glDeleteBuffers(1, byref(self.instances))
+        gl.glDeleteProgram(self.program)
+
+
+def compile_shader(shader_type, source):
+    """Returns a new shader of the given type compiled from source.  Failure
+    to compile is only reported when the program is linked.
+    """
+    shader = gl.glCreateShader(shader_type)
+    sources = (c_char_p * 1)(source)
+    gl.glShaderSource(shader, 1, cast(pointer(sources),
+                                      POINTER(POINTER(c_char))), None)
+    gl.glCompileShader(shader)
+    return shader
@@ -0,0 +1,27 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""The layers of a game's drawing batch, from back to front.
+
+Everything drawn in a game's batch belongs to one of these groups, so that
+the order in which the batch draws them is fixed.
+"""
+
+import pyglet
+
+BACKGROUND = pyglet.graphics.OrderedGroup(0)
+SPRITES = pyglet.graphics.OrderedGroup(1)
+OVERLAY = pyglet.graphics.OrderedGroup(2)
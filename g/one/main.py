@@ -16,10 +16,15 @@
 
 import pyglet
 
+from g.one import savestate
 from g.one.resources import Resources
 from g.one.game_window import GameWindow
 from g.one.options import Options
 from g.one.background_music import BackgroundMusic
+from g.one.profiler import Profiler
+from g.one.world import World
+from g.one.bullet import BulletEngine
+from g.one.rewind import Rewind
 
 
 def main():
@@ -29,6 +34,15 @@ def main():
                                     if x != 'pulse')
     Resources.init()
     Options.load()
+    # Options files from before the profiler have no 'profiler' option.
+    Profiler.enabled = Options.options.get('profiler', False)
+    World.rate = Options.options.get('simulation rate', World.rate)
+    BulletEngine.instanced = Options.options.get('instanced bullets', False)
+    Rewind.enabled = Options.options.get('rewind', False)
+    # The 'rewind memory' option is in MiB.
+    Rewind.memory_cap = Options.options.get('rewind memory', 16) * 2**20
+    savestate.default_codec = Options.options.get('savestate codec',
+                                                  savestate.default_codec)
     BackgroundMusic.init()
     window = GameWindow()
     pyglet.app.run()
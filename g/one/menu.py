@@ -36,8 +36,19 @@ class Menu():
     vertically, using the up and down arrow keys.  If horizontal selection is
     required, a HorizontalSelection can be used.
 
+    Menus are not animated, so they are only redrawn when needed.  Call
+    self.redraw after changing what a menu draws other than in response to
+    input.
+
+    Persistent menus are built once per window, see GameWindow.stage, and are
+    deactivated and activated again instead of being deleted and rebuilt.
+    Override refresh to update whatever may have changed in between.
+
     Subclass this to create other menus.
     """
+    animated = False
+    persistent = False
+
     def __init__(self, window=None):
         """Initialise the Menu.
 
@@ -57,6 +68,7 @@ class Menu():
         self.batch = pyglet.graphics.Batch()
         self._selected = 0
         self.deleted = False
+        self.active = True
         self.items = []
 
     def on_key_release(self, symbol, modifiers):
@@ -77,12 +89,40 @@ class Menu():
         """Draws the menu."""
         self.batch.draw()
 
+    def activate(self):
+        """Called when a persistent menu is shown again.  Sets up the event
+        handlers again, selects the first item and refreshes the menu.
+        """
+        self.active = True
+        if self.window is not None:
+            self.window.push_handlers(self)
+        self.selected = 0
+        self.refresh()
+
+    def deactivate(self):
+        """Called when a persistent menu stops being shown."""
+        self.active = False
+        if self.window is not None:
+            self.window.remove_handlers(self)
+
+    def refresh(self):
+        """Override this to update anything shown by a persistent menu which
+        may have changed since it was last shown.
+        """
+        pass
+
+    def redraw(self):
+        """Asks the window to redraw this menu, if it has a window."""
+        if self.window is not None:
+            self.window.redraw()
+
     def delete(self):
         """Call this when the menu is to be deleted."""
         if self.window is not None:
             self.window.remove_handlers(self)
         self.items = None  # Break the circular references.
         self.deleted = True
+        self.active = False
 
     @property
     def selected(self):
@@ -94,6 +134,7 @@ class Menu():
         self.items[self._selected].set_selected(False)
         self._selected = value
         self.items[self._selected].set_selected(True)
+        self.redraw()
 
 
 # The menus below mostly follow the patterns described in the docstrings above
@@ -101,6 +142,8 @@ class Menu():
 # documented.
 
 class MainMenu(Menu):
+    persistent = True
+
     def __init__(self, window):
         Menu.__init__(self, window)
         self.title = pyglet.text.Label(
@@ -121,22 +164,29 @@ class MainMenu(Menu):
           MenuAction(self, "Exit", quit, 427, 40)
         ]
         self.selected = 0
+        self.refresh()
+
+    def refresh(self):
         BackgroundMusic.play(Resources.menu_music)
 
     def new_game_pressed(self):
-        self.window.change_stage(NewGameMenu(self.window))
+        self.window.change_stage(self.window.stage(NewGameMenu))
 
     def load_game_pressed(self):
-        self.window.change_stage(LoadGameMenu(self.window))
+        self.window.change_stage(self.window.stage(LoadGameMenu))
 
     def highscore_list_pressed(self):
-        self.window.change_stage(HighscoresMenu(self.window))
+        highscores_menu = self.window.stage(HighscoresMenu)
+        highscores_menu.earth = True
+        self.window.change_stage(highscores_menu)
 
     def options_pressed(self):
-        self.window.change_stage(OptionsMenu(self.window))
+        self.window.change_stage(self.window.stage(OptionsMenu))
 
 
 class NewGameMenu(Menu):
+    persistent = True
+
     def __init__(self, window):
         Menu.__init__(self, window)
         self.title = pyglet.text.Label(
@@ -159,8 +209,12 @@ class NewGameMenu(Menu):
         ]
         self.selected = 0
 
+    def refresh(self):
+        for item in self.items[:3]:
+            item.selected = 0
+
     def back_pressed(self):
-        self.window.change_stage(MainMenu(self.window))
+        self.window.change_stage(self.window.stage(MainMenu))
 
     def start_pressed(self):
         from g.one.game import Game
@@ -171,11 +225,23 @@ class NewGameMenu(Menu):
         self.window.change_stage(game)
 
 
-class LoadGameMenu(Menu):
-    def __init__(self, window):
+class SavestateMenu(Menu):
+    """The abstract menu of savestate slots.  Slots are shown a page at a
+    time and left and right change the page.  The items of a page are built
+    when it is shown, from the savestate manifest, so no savestate is opened.
+
+    Savestates are saved and loaded in the background.  Set self.busy while
+    one is, to ignore input until it is done, and report progress with
+    set_status.
+
+    Subclass this and override slot_item and back_pressed.
+    """
+    page_size = 3
+
+    def __init__(self, window, title):
         Menu.__init__(self, window)
         self.title = pyglet.text.Label(
-          'Load Game',
+          title,
           font_name='Times New Roman',
           font_size=25,
           x=427, y=400,
@@ -183,34 +249,129 @@ class LoadGameMenu(Menu):
           anchor_x='center', anchor_y='center',
           batch=self.batch
         )
-        self.items = []
-        self.items += [self.savestate_option(i) for i in range(3)]
-        self.items += [MenuAction(self, "Back", self.back_pressed, 100, 40)]
+        self.page_label = pyglet.text.Label(
+          '',
+          font_name='Times New Roman',
+          font_size=10,
+          x=427, y=70,
+          color=(255, 255, 255, 255),
+          anchor_x='center', anchor_y='center',
+          batch=self.batch
+        )
+        self.status = pyglet.text.Label(
+          '',
+          font_name='Times New Roman',
+          font_size=16,
+          x=427, y=350,
+          color=(255, 255, 255, 255),
+          anchor_x='center', anchor_y='center',
+          batch=self.batch
+        )
+        self.busy = False
+        self.manifest = savestate.load_manifest()
+        self.page = 0
+        self.items = [MenuAction(self, "Back", self.back_pressed, 100, 40)]
+        self.show_page(0)
+
+    @property
+    def pages(self):
+        return -(-savestate.SLOTS // self.page_size)
+
+    def show_page(self, page):
+        """Replaces the slot items with those of the given page"""
+        for item in self.items[:-1]:
+            item.delete()
+        first = page * self.page_size
+        last = min(first + self.page_size, savestate.SLOTS)
+        self.items[:-1] = [self.slot_item(statenum, 160 - 30*i)
+                           for i, statenum in enumerate(range(first, last))]
+        self.page = page
+        set_text(self.page_label,
+                 "<< Page " + str(page+1) + " of " + str(self.pages) + " >>")
+        self.selected = min(self.selected, len(self.items)-1)
+
+    def on_key_release(self, symbol, modifiers):
+        if self.busy:
+            return
+        if symbol in (key.LEFT, key.RIGHT):
+            step = -1 if symbol == key.LEFT else 1
+            page = min(max(self.page + step, 0), self.pages-1)
+            if page != self.page:
+                self.show_page(page)
+        else:
+            Menu.on_key_release(self, symbol, modifiers)
+
+    def refresh(self):
+        """Shows the first page again, rebuilding it only if the manifest
+        has changed
+        """
+        self.set_status('')
+        manifest = savestate.load_manifest()
+        if manifest != self.manifest or self.page != 0:
+            self.manifest = manifest
+            self.show_page(0)
+
+    def set_status(self, text):
+        set_text(self.status, text)
+        self.redraw()
+
+    def slot_text(self, statenum):
+        entry = self.manifest.get(statenum)
+        info = "Empty" if entry is None else entry['info']
+        return "State " + str(statenum+1) + ": " + info
+
+    def slot_item(self, statenum, y):
+        """Override this to return the menu item of a slot"""
+        pass
+
+
+class LoadGameMenu(SavestateMenu):
+    persistent = True
+
+    def __init__(self, window):
+        SavestateMenu.__init__(self, window, 'Load Game')
         self.selected = 0
 
     def back_pressed(self):
-        self.window.change_stage(MainMenu(self.window))
+        self.window.change_stage(self.window.stage(MainMenu))
 
     def load_state_function(self, statenum):
+        statenum_text = "state " + str(statenum+1)
+
+        def progress(fraction):
+            self.set_status("Loading " + statenum_text + "... " +
+                            str(int(fraction * 100)) + "%")
+
+        def loaded(game, error):
+            self.busy = False
+            if error is not None:
+                self.set_status("Could not load " + statenum_text)
+            else:
+                self.window.change_stage(game)
+
         def load_state():
-            game = savestate.load_state(statenum, self.window)
-            self.window.change_stage(game)
+            self.busy = True
+            self.set_status("Loading " + statenum_text + "...")
+            savestate.load_state_async(statenum, self.window, loaded,
+                                       progress)
         return load_state
 
-    def savestate_option(self, statenum):
-        y = 160 - 30*statenum
-        statenum_text = "State " + str(statenum+1) + ": "
-        info = savestate.get_state_info(statenum)
-        if info is None:
-            return MenuItem(self, statenum_text + "Empty", 427, y)
+    def slot_item(self, statenum, y):
+        if statenum not in self.manifest:
+            return MenuItem(self, self.slot_text(statenum), 427, y)
         else:
             return MenuAction(self,
-                              statenum_text + info,
+                              self.slot_text(statenum),
                               self.load_state_function(statenum),
                               427, y)
 
 
 class HighscoresMenu(Menu):
+    """Set earth before showing this menu, which also loads any new
+    highscores.
+    """
+    persistent = True
+
     def __init__(self, window, earth=True):
         Menu.__init__(self, window)
         self.title = pyglet.text.Label(
@@ -308,19 +469,21 @@ class HighscoresMenu(Menu):
 
     @earth.setter
     def earth(self, value):
+        """Shows the highscores of the Earthlings or the Aliens.  Only the
+        labels whose text has changed are laid out again.
+        """
         self._earth = value
-        self.title.text = "Highscores - " + (
-          "Earthlings" if value else "Aliens")
+        set_text(self.title, "Highscores - " + (
+          "Earthlings" if value else "Aliens"))
         score_list = highscores.load_highscores()[0 if value else 1]
         for row, data in zip_longest(self.scores, score_list):
             if data is None:
-                row[1].text = "..."
-                row[2].text = ""
-                row[3].text = ""
+                texts = ("...", "", "")
             else:
-                row[1].text = data[0]
-                row[2].text = ["Normal", "Hard"][data[1]]
-                row[3].text = str(data[2])
+                texts = (data[0], ["Normal", "Hard"][data[1]], str(data[2]))
+            for label, text in zip(row[1:], texts):
+                set_text(label, text)
+        self.redraw()
 
     def earth_pressed(self):
         self.earth = True
@@ -329,10 +492,12 @@ class HighscoresMenu(Menu):
         self.earth = False
 
     def back_pressed(self):
-        self.window.change_stage(MainMenu(self.window))
+        self.window.change_stage(self.window.stage(MainMenu))
 
 
 class OptionsMenu(Menu):
+    persistent = True
+
     def __init__(self, window):
         Menu.__init__(self, window)
         self.title = pyglet.text.Label(
@@ -352,17 +517,20 @@ class OptionsMenu(Menu):
                      center=False),
           MenuAction(self, "Back", self.back_pressed, 100, 40)
         ]
+        self.refresh()
+        self.selected = 0
+
+    def refresh(self):
         if Options.options['fullscreen']:
             self.items[0].selected = 1
         else:
             self.items[0].selected = 0
         self.items[1].value = Options.options['music']
         self.items[2].value = Options.options['sound effects']
-        self.selected = 0
 
     def on_key_release(self, symbol, modifiers):
         Menu.on_key_release(self, symbol, modifiers)
-        if self.deleted:
+        if not self.active:
             return
         Options.options['fullscreen'] = self.items[0].selected == 1
         Options.changed()
@@ -378,14 +546,16 @@ class OptionsMenu(Menu):
 
     def back_pressed(self):
         Options.save()
-        self.window.change_stage(MainMenu(self.window))
+        self.window.change_stage(self.window.stage(MainMenu))
 
     def controls_pressed(self):
         Options.save()
-        self.window.change_stage(ControlsMenu(self.window))
+        self.window.change_stage(self.window.stage(ControlsMenu))
 
 
 class ControlsMenu(Menu):
+    persistent = True
+
     def __init__(self, window):
         Menu.__init__(self, window)
         self.hselected = 0
@@ -443,13 +613,20 @@ class ControlsMenu(Menu):
         ]
         self.selected = 0
 
+    def refresh(self):
+        controls = Options.options['controls']
+        for _key, hsel in zip([key.UP, key.RIGHT, key.DOWN, key.LEFT,
+                               key.SPACE], self.items[:-1]):
+            hsel.options[0].selected_key = controls[0][_key]
+            hsel.options[1].selected_key = controls[1][_key]
+
     def back_pressed(self):
         for _key, hsel in zip([key.UP, key.RIGHT, key.DOWN, key.LEFT,
                                key.SPACE], self.items[:-1]):
             Options.options['controls'][0][_key] = hsel.options[0].selected_key
             Options.options['controls'][1][_key] = hsel.options[1].selected_key
         Options.save()
-        self.window.change_stage(OptionsMenu(self.window))
+        self.window.change_stage(self.window.stage(OptionsMenu))
 
 
 class GameOverMenu(Menu):
@@ -535,7 +712,9 @@ class GameOverMenu(Menu):
             if self.highscore:
                 highscores.add_highscore(self.earth, self.player_name,
                                          self.difficulty, self.score)
-            self.window.change_stage(HighscoresMenu(self.window, self.earth))
+            highscores_menu = self.window.stage(HighscoresMenu)
+            highscores_menu.earth = self.earth
+            self.window.change_stage(highscores_menu)
 
     def on_text(self, text):
         # Required for name entry
@@ -36,11 +36,9 @@ class MenuItem():
           font_name='Times New Roman',
           font_size=16,
           x=x, y=y,
-          anchor_x='center', anchor_y='center',
+          anchor_x='center' if center else 'left', anchor_y='center',
           batch=menu.batch
         )
-        if not center:
-            self.label.anchor_x = 'left'
 
     def on_key_release(self, symbol, modifiers):
         """Override this to provide your own functionality.  Menus will call
@@ -48,6 +46,10 @@ class MenuItem():
         """
         pass
 
+    def delete(self):
+        """Call this when the item is removed from its menu."""
+        self.label.delete()
+
     def set_selected(self, selected):
         """Menus will call this to inform the item it got (de)selected"""
         if selected:
@@ -61,7 +63,7 @@ class MenuItem():
 
     @text.setter
     def text(self, value):
-        self.label.text = value
+        set_text(self.label, value)
 
 
 class MenuAction(MenuItem):
@@ -104,7 +106,7 @@ class KeySelector(MenuItem):
     @selected_key.setter
     def selected_key(self, value):
         self._selected_key = value
-        self.label.text = "[" + key.symbol_string(value) + "]"
+        set_text(self.label, "[" + key.symbol_string(value) + "]")
 
 
 class OptionSelector(MenuItem):
@@ -138,7 +140,7 @@ class OptionSelector(MenuItem):
     @selected.setter
     def selected(self, value):
         self._selected = value
-        self.option_label.text = "<< " + self.options[value] + " >>"
+        set_text(self.option_label, "<< " + self.options[value] + " >>")
 
 
 class Slider(MenuItem):
@@ -189,6 +191,7 @@ class Slider(MenuItem):
         self.slider.vertices[0] = center - 5
         self.slider.vertices[2] = center + 5
         self.slider.vertices[4] = center
+        self.menu.redraw()
 
     def __del__(self):
         # Free vertex lists from memory.
@@ -235,3 +238,11 @@ class HorizontalSelection():
         else:
             self.menu.hselected = value
         self.options[value].set_selected(True)
+
+
+def set_text(label, text):
+    """Sets the text of a label, unless it already has that text.  Setting a
+    label's text lays it out again even if the text is the same.
+    """
+    if label.text != text:
+        label.text = text
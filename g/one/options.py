@@ -53,7 +53,15 @@ class Options():
       'fullscreen': False,
       'music': 100,
       'sound effects': 100,
-      'controls': default_controls
+      'controls': default_controls,
+      'profiler': False,
+      'simulation rate': 60,
+      'vsync': True,
+      'render scale': 0,
+      'instanced bullets': False,
+      'rewind': False,
+      'rewind memory': 16,
+      'savestate codec': 'zlib'
     }
 
     listeners = []
@@ -19,6 +19,7 @@ from pyglet.window import key
 
 from g.one import savestate
 from g.one.menu import Menu
+from g.one.menu import SavestateMenu
 from g.one.menu import HighscoresMenu
 from g.one.menu_item import *
 
@@ -61,58 +62,48 @@ class PauseMenu(Menu):
         self.game.exit()
 
 
-class SaveGameMenu(Menu):
+class SaveGameMenu(SavestateMenu):
     def __init__(self, game):
-        Menu.__init__(self)
         self.game = game
-        self.title = pyglet.text.Label(
-          'Save Game',
-          font_name='Times New Roman',
-          font_size=25,
-          x=427, y=400,
-          color=(255, 255, 255, 255),
-          anchor_x='center', anchor_y='center',
-          batch=self.batch
-        )
-        self.status = pyglet.text.Label(
-          '',
-          font_name='Times New Roman',
-          font_size=16,
-          x=427, y=350,
-          color=(255, 255, 255, 255),
-          anchor_x='center', anchor_y='center',
-          batch=self.batch
-        )
-        self.items = []
-        self.items += [self.savestate_option(i) for i in range(3)]
-        self.items += [MenuAction(self, "Back", self.back_pressed, 100, 40)]
+        SavestateMenu.__init__(self, None, 'Save Game')
         self.selected = 0
 
     def back_pressed(self):
         self.game.change_pause(PauseMenu(self.game))
 
+    def redraw(self):
+        """Pause menus have no window, so ask the Game's window to redraw"""
+        self.game.window.redraw()
+
     def save_state_function(self, statenum):
+        statenum_text = "state " + str(statenum+1)
+
+        def saved(entry, error):
+            self.busy = False
+            if error is not None:
+                self.set_status("Could not save to " + statenum_text)
+                return
+            self.manifest[statenum] = entry
+            self.set_status("Saved to " + statenum_text)
+            # Input was ignored while saving, so the slot is still selected.
+            self.items[self.selected].text = self.slot_text(statenum)
+
         def save_state():
-            savestate.save_state(statenum, self.game)
-            self.status.text = "Saved to state " + str(statenum+1)
-            statenum_text = "State " + str(statenum+1) + ": "
-            info = savestate.get_state_info(statenum)
-            self.items[statenum].text = statenum_text + info
+            self.busy = True
+            self.set_status("Saving to " + statenum_text + "...")
+            savestate.save_state_async(statenum, self.game, saved)
         return save_state
 
-    def savestate_option(self, statenum):
-        y = 160 - 30*statenum
-        statenum_text = "State " + str(statenum+1) + ": "
-        info = savestate.get_state_info(statenum)
-        if info is None:
-            info = "Empty"
+    def slot_item(self, statenum, y):
         return MenuAction(self,
-                          statenum_text + info,
+                          self.slot_text(statenum),
                           self.save_state_function(statenum),
                           427, y)
 
 
 class HighscoresPauseMenu(HighscoresMenu):
+    persistent = False
+
     def __init__(self, game):
         self.game = game
         HighscoresMenu.__init__(self, None, game.earth)
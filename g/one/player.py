@@ -19,7 +19,7 @@ from pyglet.window import key
 
 from g.one.resources import Resources
 from g.one.sprite import GameSprite
-from g.one.bullet import Bullet
+from g.one.bullet import BULLET
 
 
 class Player(GameSprite):
@@ -46,7 +46,7 @@ class Player(GameSprite):
         if self.keystate[4] and self.cooldown <= 0:
             self.cooldown = 0.125
             bullet_pos = (self.hcenter, self.vcenter)
-            Bullet(self.stage, self.earth, bullet_pos, (0, 500))
+            self.stage.bullets.spawn(BULLET, self.earth, bullet_pos, (0, 500))
 
     def on_key(self, direction, pressed):
         """Call this when a key is pressed which corresponds to the player's
@@ -75,6 +75,8 @@ class Player(GameSprite):
             self.health = 100
             self.x = 0
             self.y = 0
+            self.save_position()
+            self.stage.player_index.move(self)
             self.stage.lives -= 1
 
     def __getstate__(self):
@@ -0,0 +1,139 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+from collections import deque
+
+import pyglet
+
+
+class Profiler():
+    """Keeps rolling timings of the game's hot paths and live counts of its
+    entities.  This is a static class.
+
+    Time a section of code with:
+
+        start = Profiler.start()
+        ...
+        Profiler.stop('name', start)
+
+    Nothing is recorded unless Profiler.enabled is True.  When it is not,
+    start returns None and stop returns immediately, so the timers cost next
+    to nothing.  Use report to read the data.
+    """
+    enabled = False
+
+    # The number of samples kept for each timing
+    samples = 120
+
+    timings = {}
+    counts = {}
+
+    @classmethod
+    def start(cls):
+        """Returns the start time of a section, or None if disabled."""
+        if cls.enabled:
+            return time.perf_counter()
+        return None
+
+    @classmethod
+    def stop(cls, name, start):
+        """Records the time since start for the named section."""
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        try:
+            cls.timings[name].append(elapsed)
+        except KeyError:
+            cls.timings[name] = deque([elapsed], cls.samples)
+
+    @classmethod
+    def count(cls, name, value):
+        """Records the latest value of the named count, if enabled."""
+        if cls.enabled:
+            cls.counts[name] = value
+
+    @classmethod
+    def reset(cls):
+        """Forgets all timings and counts."""
+        cls.timings = {}
+        cls.counts = {}
+
+    @classmethod
+    def report(cls):
+        """Returns a dict of the mean, last and max time in milliseconds of
+        every section over the last Profiler.samples samples, and the latest
+        value of every count.
+        """
+        timings = {}
+        for name, samples in cls.timings.items():
+            timings[name] = {
+              'mean_ms': sum(samples) / len(samples) * 1000,
+              'last_ms': samples[-1] * 1000,
+              'max_ms': max(samples) * 1000,
+            }
+        return {'timings': timings, 'counts': dict(cls.counts)}
+
+
+def clock_callbacks():
+    """Returns the number of callbacks scheduled on pyglet's default clock."""
+    clock = pyglet.clock.get_default()
+    return (len(getattr(clock, '_schedule_items', ())) +
+            len(getattr(clock, '_schedule_interval_items', ())))
+
+
+def batch_draw_calls(batch):
+    """Returns the number of draw calls batch.draw makes, which is one for each
+    vertex domain of each group.
+    """
+    return sum(len(domains) for domains in batch.group_map.values())
+
+
+class ProfilerOverlay():
+    """Draws the Profiler's report over a stage.  The text is only laid out
+    again every refresh seconds.
+    """
+    refresh = 0.25
+
+    def __init__(self):
+        self.label = pyglet.text.Label(
+          '',
+          font_name='Times New Roman',
+          font_size=10,
+          x=854, y=0,
+          width=240,
+          multiline=True,
+          color=(255, 255, 0, 255),
+          anchor_x='right', anchor_y='bottom'
+        )
+        self.updated = 0
+
+    def draw(self):
+        now = time.perf_counter()
+        if now - self.updated >= ProfilerOverlay.refresh:
+            self.updated = now
+            self.label.text = self.format(Profiler.report())
+        self.label.draw()
+
+    @staticmethod
+    def format(report):
+        lines = []
+        for name, timing in sorted(report['timings'].items()):
+            lines.append("{}: {:.2f} ms (max {:.2f})".format(
+              name, timing['mean_ms'], timing['max_ms']))
+        for name, value in sorted(report['counts'].items()):
+            lines.append("{}: {}".format(name, value))
+        return "\n".join(lines)
@@ -0,0 +1,142 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+class Registry():
+    """An ordered collection of entities with O(1) adding and removing.
+
+    Entities are kept in a list in the order in which they were added, which
+    is the order of iteration.  Removing an entity leaves a hole in its place.
+    Once half of the list is holes, the entities are packed together again
+    without changing their order, so removing is O(1) on average and the
+    game steps enemies in the same order as the plain list it replaced.
+
+    Every entity is given a handle when it is added.  Handles never change and
+    are never reused, so they can be used to refer to an entity which may
+    since have been removed.
+
+    It is safe to add and remove entities while iterating.  Entities added
+    during an iteration are not visited by it and entities removed during an
+    iteration are not visited if they have not been already.
+    """
+    def __init__(self, entities=()):
+        self.entities = []
+        self.positions = {}
+        self.handles = {}
+        self.next_handle = 0
+        self.iterating = 0
+        self.holes = 0
+        for entity in entities:
+            self.add(entity)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __bool__(self):
+        return bool(self.positions)
+
+    def __contains__(self, entity):
+        return entity in self.positions
+
+    def __iter__(self):
+        self.iterating += 1
+        try:
+            entities = self.entities
+            for i in range(len(entities)):
+                entity = entities[i]
+                if entity is not None:
+                    yield entity
+        finally:
+            self.iterating -= 1
+            self.compact_if_sparse()
+
+    def add(self, entity):
+        """Adds an entity and returns its handle."""
+        handle = self.next_handle
+        self.next_handle += 1
+        self.positions[entity] = [len(self.entities), handle]
+        self.handles[handle] = entity
+        self.entities.append(entity)
+        return handle
+
+    def remove(self, entity):
+        """Removes an entity.  Raises KeyError if it is not in the registry."""
+        i, handle = self.positions.pop(entity)
+        del self.handles[handle]
+        self.entities[i] = None
+        self.holes += 1
+        self.compact_if_sparse()
+
+    def get(self, handle):
+        """Returns the entity with the given handle, or None if it has been
+        removed.
+        """
+        return self.handles.get(handle)
+
+    def handle(self, entity):
+        """Returns the handle of an entity in the registry."""
+        return self.positions[entity][1]
+
+    def clear(self):
+        """Removes every entity at once."""
+        if self.iterating:
+            self.entities[:] = [None] * len(self.entities)
+            self.holes = len(self.entities)
+        else:
+            self.entities = []
+            self.holes = 0
+        self.positions = {}
+        self.handles = {}
+
+    def compact_if_sparse(self):
+        """Packs the entities together, keeping their order, if half of the
+        list is holes and nothing is iterating over it.
+        """
+        if self.iterating or self.holes * 2 < len(self.entities):
+            return
+        self.entities = [e for e in self.entities if e is not None]
+        for i, entity in enumerate(self.entities):
+            self.positions[entity][0] = i
+        self.holes = 0
+
+    def __getstate__(self):
+        entities = [e for e in self.entities if e is not None]
+        return {
+          'entities': entities,
+          'handles': [self.positions[e][1] for e in entities],
+          'next_handle': self.next_handle,
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        for entity, handle in zip(state['entities'], state['handles']):
+            self.positions[entity] = [len(self.entities), handle]
+            self.handles[handle] = entity
+            self.entities.append(entity)
+        self.next_handle = state['next_handle']
+
+    @classmethod
+    def from_handles(cls, entities, handles, next_handle):
+        """Returns a Registry holding the given entities under the given
+        handles, as though it had been unpickled.
+        """
+        registry = cls.__new__(cls)
+        registry.__setstate__({
+          'entities': entities,
+          'handles': handles,
+          'next_handle': next_handle,
+        })
+        return registry
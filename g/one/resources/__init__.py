@@ -14,33 +14,81 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import string
+
 import pyglet
+import pyglet.image.atlas
 from pyglet.image.codecs.png import PNGImageDecoder
 
 
 class Resources():
-    """Loads resources.  This is a static class."""
+    """Loads resources.  This is a static class.
+
+    The images of the sprites and bullets are packed into as few textures as
+    possible, normally one, so that a game's batch can draw them all with the
+    same texture bound.  Each *_image attribute is then a region of one of
+    those textures.
+
+    The background, space_image, is uploaded as a mipmapped texture of its
+    own.  Its decoded pixels are not kept in memory once uploaded.
+
+    The font used by every label is loaded once in each size used, and the
+    glyphs of every character which can appear in a menu are rendered up
+    front.  pyglet only keeps fonts while they are in use, so the loaded fonts
+    are kept in fonts to share them and their glyphs between menus.
+    """
+    font_name = 'Times New Roman'
+    font_sizes = (10, 16, 25, 36)
+    alphabet = string.ascii_letters + string.digits + string.punctuation + ' '
+
     @classmethod
-    def init(cls):
-        """Call this method once on application initialisation"""
+    def init(cls, sound=True, atlas=True, fonts=True):
+        """Call this method once on application initialisation.  Set sound to
+        False to only load images, for when there is no audio device.  Set
+        atlas to False to load the images without creating textures or
+        fonts, for when there is no GL context.  Set fonts to False to leave
+        fonts to be loaded when they are first used.
+        """
         pyglet.resource.path = ['@g.one.resources']
         pyglet.resource.reindex()
 
+        cls.fonts = {}
+        if atlas and fonts:
+            cls.load_fonts()
+
+        cls.texture_bin = pyglet.image.atlas.TextureBin() if atlas else None
         cls.space_image = cls.load_image("space.png")
-        cls.ship_image = cls.load_image("ship.png")
-        cls.earth_bullet_image = cls.load_image("earth_bullet.png")
-        cls.alien_bullet_image = cls.load_image("alien_bullet.png")
-        cls.earth_player_image = cls.load_image("earth_player.png")
-        cls.alien_player_image = cls.load_image("alien_player.png")
-        cls.earth_tracker_image = cls.load_image("earth_tracker.png")
-        cls.alien_tracker_image = cls.load_image("alien_tracker.png")
-        cls.earth_splitter_image = cls.load_image("earth_splitter.png")
-        cls.alien_splitter_image = cls.load_image("alien_splitter.png")
+        if atlas:
+            cls.space_image = cls.space_image.get_mipmapped_texture()
+        cls.ship_image = cls.load_sprite_image("ship.png")
+        cls.earth_bullet_image = cls.load_sprite_image("earth_bullet.png")
+        cls.alien_bullet_image = cls.load_sprite_image("alien_bullet.png")
+        cls.earth_player_image = cls.load_sprite_image("earth_player.png")
+        cls.alien_player_image = cls.load_sprite_image("alien_player.png")
+        cls.earth_tracker_image = cls.load_sprite_image("earth_tracker.png")
+        cls.alien_tracker_image = cls.load_sprite_image("alien_tracker.png")
+        cls.earth_splitter_image = cls.load_sprite_image(
+            "earth_splitter.png")
+        cls.alien_splitter_image = cls.load_sprite_image(
+            "alien_splitter.png")
 
+        if not sound:
+            cls.menu_music = cls.game_music = cls.explosion_sound = None
+            return
         cls.menu_music = cls.load_sound("menu.wav")
         cls.game_music = cls.load_sound("game.wav")
         cls.explosion_sound = cls.load_sound("explosion.wav")
 
+    @classmethod
+    def load_fonts(cls):
+        """Loads the font in every size in font_sizes and renders the glyphs
+        of the alphabet in each.
+        """
+        for size in cls.font_sizes:
+            font = pyglet.font.load(cls.font_name, size)
+            font.get_glyphs(cls.alphabet)
+            cls.fonts[size] = font
+
     @staticmethod
     def load_image(filename):
         """Loads an image from the specified filename"""
@@ -49,6 +97,26 @@ class Resources():
             decoder = PNGImageDecoder()
             return pyglet.image.load(filename, file=f, decoder=decoder)
 
+    @classmethod
+    def load_sprite_image(cls, filename):
+        """Loads an image from the specified filename into the texture atlas.
+        Returns the image's region of the atlas, or the image itself if there
+        is no atlas.
+        """
+        image = cls.load_image(filename)
+        if cls.texture_bin is None:
+            return image
+        return cls.texture_bin.add(image)
+
+    @classmethod
+    def textures(cls):
+        """Returns the number of textures the sprite images are packed into, or
+        None if there is no atlas.
+        """
+        if cls.texture_bin is None:
+            return None
+        return len(cls.texture_bin.atlases)
+
     @staticmethod
     def load_sound(filename):
         """Loads an sound from the specified filename"""
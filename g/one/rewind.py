@@ -0,0 +1,279 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+import io
+import struct
+import zlib
+
+import numpy as np
+
+from g.one import snapshot
+
+
+# The packed arrays of a snapshot, in the order they are written, and the
+# GAME fields which count them
+GROUPS = (('player_arrays', 'players', snapshot.PLAYER_ARRAYS),
+          ('enemy_arrays', 'enemies', snapshot.ENEMY_ARRAYS),
+          ('bullet_arrays', 'bullets', snapshot.BULLET_ARRAYS))
+HEAD_LENGTH = struct.Struct('<I')
+
+
+def xor(data, base):
+    """Returns data XORed with base, where base is cut or padded with zeros
+    to the length of data
+    """
+    result = np.frombuffer(data, np.uint8).copy()
+    n = min(len(data), len(base))
+    result[:n] ^= np.frombuffer(base, np.uint8, n)
+    return result.tobytes()
+
+
+def split(data):
+    """Splits an uncompressed snapshot into the bytes before its packed
+    arrays and the state decoded by snapshot.decode
+    """
+    state = snapshot.decode(io.BytesIO(data))
+    size = sum(array.nbytes for key, count, layout in GROUPS
+               for array in state[key].values())
+    return data[:len(data) - size], state
+
+
+def counts(head):
+    """Returns the number of entities in each group from the bytes before the
+    packed arrays of an uncompressed snapshot
+    """
+    f = io.BytesIO(head)
+    snapshot.read_info(f)
+    game = snapshot.GAME.unpack(f.read(snapshot.GAME.size))
+    state = dict(zip(snapshot.GAME_FIELDS, game))
+    return [state[count] for key, count, layout in GROUPS]
+
+
+def rows(array, dtype, width):
+    """Returns the bytes of each element of a packed array as rows"""
+    size = np.dtype(dtype).itemsize * width
+    return np.ascontiguousarray(array, dtype).view(np.uint8).reshape(-1, size)
+
+
+def match(key, count, handles, base):
+    """Returns the index in the decoded state base of each of count entities
+    in a group, or -1 where it has none.  Enemies are matched by handle, and
+    players and bullets by slot.
+    """
+    if handles is None:
+        index = np.arange(count)
+        index[index >= len(base[key]['pos'])] = -1
+        return index
+    old = base[key]['handle']
+    if not len(old):
+        return np.full(count, -1)
+    order = np.argsort(old)
+    index = order[np.minimum(np.searchsorted(old, handles, sorter=order),
+                             len(old) - 1)]
+    return np.where(old[index] == handles, index, -1)
+
+
+def aligned(array, index, dtype, width):
+    """Returns rows of the elements of a packed array at index, with zeros
+    where index is -1
+    """
+    old = rows(array, dtype, width)
+    result = np.zeros((len(index), old.shape[1]), np.uint8)
+    found = index >= 0
+    result[found] = old[index[found]]
+    return result
+
+
+def delta(data, base):
+    """Returns the delta from base to data, both split snapshots.  Each field
+    of each entity is XORed with the same field of the same entity in base,
+    and the bytes are grouped by their place in the field.
+    """
+    head, state = data
+    parts = [HEAD_LENGTH.pack(len(head)), xor(head, base[0])]
+    for key, count, layout in GROUPS:
+        arrays = state[key]
+        index = match(key, state[count], arrays.get('handle'), base[1])
+        for name, dtype, width in layout:
+            new = rows(arrays[name], dtype, width)
+            if name != 'handle':
+                new = new ^ aligned(base[1][key][name], index, dtype, width)
+            parts.append(new.T.tobytes())
+    return b''.join(parts)
+
+
+def undelta(data, base):
+    """Returns the uncompressed snapshot from a delta and the split snapshot
+    it is from
+    """
+    offset = HEAD_LENGTH.size
+    length, = HEAD_LENGTH.unpack_from(data)
+    head = xor(data[offset:offset+length], base[0])
+    offset += length
+    parts = [head]
+    for (key, count, layout), n in zip(GROUPS, counts(head)):
+        fields = {}
+        for name, dtype, width in layout:
+            size = np.dtype(dtype).itemsize * width
+            fields[name] = np.frombuffer(data, np.uint8, n * size,
+                                         offset).reshape(size, n).T
+            offset += n * size
+        handles = None
+        if 'handle' in fields:
+            handles = np.ascontiguousarray(fields['handle']).view('<i8')
+            handles = handles.ravel()
+        index = match(key, n, handles, base[1])
+        for name, dtype, width in layout:
+            field = fields[name]
+            if name != 'handle':
+                field = field ^ aligned(base[1][key][name], index, dtype,
+                                        width)
+            parts.append(np.ascontiguousarray(field).tobytes())
+    return b''.join(parts)
+
+
+class Rewind():
+    """A bounded in-memory history of a Game, which the Game can be rewound
+    to.  Used for practice: press backspace to rewind one second.
+
+    Every interval ticks, the Game is snapshotted (see g.one.snapshot).  Most
+    snapshots are stored as deltas from the snapshot before, compressed.  A
+    delta XORs each field of each entity with the same field of the same
+    entity before: enemies are matched by handle, players and bullets by
+    slot.  Entities which are new are stored as they are.  Every
+    keyframe_interval snapshots, or whenever it would be smaller than the
+    delta, the whole snapshot is compressed and stored as a keyframe instead.
+
+    Rewinding rebuilds the snapshot from the keyframe before it and the deltas
+    in between.  Once the history uses more than memory_cap bytes, the oldest
+    keyframe and its deltas are dropped.  The newest keyframe and its deltas
+    are always kept, even if they alone use more than memory_cap bytes.
+
+    If Rewind.enabled is False, Rewind.create returns None and Games keep no
+    history.
+    """
+    enabled = False
+    memory_cap = 16 * 2**20
+    interval = 6
+    keyframe_interval = 10
+
+    def __init__(self, interval=None, keyframe_interval=None,
+                 memory_cap=None):
+        """The arguments default to the class attributes of the same names"""
+        self.interval = interval or Rewind.interval
+        self.keyframe_interval = keyframe_interval or Rewind.keyframe_interval
+        self.memory_cap = memory_cap or Rewind.memory_cap
+        # Tuples of (ticks, keyframe, data), oldest first
+        self.frames = collections.deque()
+        self.size = 0
+        self.keyframes = 0
+        self.last = None
+        # self.last split by split, which deltas are from
+        self.base = None
+        self.deltas = 0
+
+    @classmethod
+    def create(cls):
+        """Returns a new Rewind, or None if rewinding is disabled"""
+        return cls() if cls.enabled else None
+
+    @property
+    def memory(self):
+        """The number of bytes used by the history"""
+        return self.size + (0 if self.last is None else len(self.last))
+
+    @property
+    def ticks(self):
+        """The ticks which can be rewound to, oldest first"""
+        return [frame[0] for frame in self.frames]
+
+    def record(self, game):
+        """Call this after every tick.  Snapshots the Game every interval
+        ticks.
+        """
+        ticks = game.world.ticks
+        if ticks % self.interval:
+            return
+        f = io.BytesIO()
+        snapshot.write(f, "", game)
+        data = f.getvalue()
+        base = split(data)
+        keyframe = zlib.compress(data, 1)
+        if self.last is not None and self.deltas < self.keyframe_interval - 1:
+            compressed = zlib.compress(delta(base, self.base), 1)
+            if len(compressed) < len(keyframe):
+                self.append(ticks, False, compressed)
+                self.deltas += 1
+                self.last = data
+                self.base = base
+                return
+        self.append(ticks, True, keyframe)
+        self.deltas = 0
+        self.last = data
+        self.base = base
+
+    def append(self, ticks, keyframe, data):
+        self.frames.append((ticks, keyframe, data))
+        self.size += len(data)
+        self.keyframes += keyframe
+        while self.memory > self.memory_cap and self.keyframes > 1:
+            # Drop the oldest keyframe and the deltas which depend on it.
+            # There is a later keyframe, so the history is never emptied.
+            self.drop()
+            while not self.frames[0][1]:
+                self.drop()
+
+    def drop(self):
+        ticks, keyframe, data = self.frames.popleft()
+        self.size -= len(data)
+        self.keyframes -= keyframe
+
+    def decompress(self, i):
+        """Returns the i-th snapshot in the history"""
+        start = i
+        while not self.frames[start][1]:
+            start -= 1
+        data = zlib.decompress(self.frames[start][2])
+        for j in range(start+1, i+1):
+            data = undelta(zlib.decompress(self.frames[j][2]), split(data))
+        return data
+
+    def restore(self, ticks, window):
+        """Returns the Game as it was at the latest tick in the history which
+        is no later than ticks, or the earliest one if there is none.  The
+        Game is built by snapshot.read and is headless if window is None.  It
+        takes over this history, which forgets everything after that tick.
+        """
+        i = 0
+        for j, frame in enumerate(self.frames):
+            if frame[0] <= ticks:
+                i = j
+        data = self.decompress(i)
+        while len(self.frames) > i + 1:
+            ticks, keyframe, frame = self.frames.pop()
+            self.size -= len(frame)
+            self.keyframes -= keyframe
+        self.last = data
+        self.base = split(data)
+        self.deltas = 0
+        for frame in reversed(self.frames):
+            if frame[1]:
+                break
+            self.deltas += 1
+        game = snapshot.read(io.BytesIO(data), window)
+        game.rewind = self
+        return game
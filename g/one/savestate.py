@@ -14,51 +14,317 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import io
+import os
+import pickle
+import threading
+import time
+import zlib
+
+import pyglet
 from pyglet.resource import get_settings_path
 
-from g.one.game_pickler import GamePickler, GameUnpickler
+from g.one import snapshot
+from g.one.game_pickler import GameUnpickler
+
+"""Savestates are snapshots; see g.one.snapshot.  Each begins with a string
+describing the savestate, which provides info such as the difficulty and
+level, followed by the Game itself.
+
+The manifest records the info string, the time saved, the size and the CRC-32
+of the savestate in every slot, so menus can list the slots without opening
+any savestates.  It is replaced atomically whenever a slot is saved to, and
+is rebuilt from the savestates themselves if it is missing or unreadable.
+
+Savestates are compressed as they are written, with default_codec unless
+another codec is given.  See snapshot.CODECS.
 
-"""Savestates are created using GamePicklers.  Two parts are pickled in the
-following order:
+Savestates and the manifest are written to a temporary file which is then
+renamed over the old one, so a slot is never left half-written.  Use
+save_state_async and load_state_async to do the file I/O on a worker thread
+so that the game keeps drawing in the meantime.
 
-1. A string describing the savestate.  Provides info such as the difficultly
-   and level
+Savestates from before snapshots were created using GamePicklers.  They are
+still loaded if a slot has no snapshot, and are replaced when the slot is
+next saved to.  Two parts are pickled in the following order:
+
+1. The info string
 
 2. The Game itself
 """
 
+# The number of savestate slots
+SLOTS = 12
+
+# Held while the manifest is read or replaced
+manifest_lock = threading.RLock()
+
+# The codec savestates are compressed with by default
+default_codec = 'zlib'
+
+
+class ChecksumFile():
+    """Wraps a binary file, keeping the size and CRC-32 of everything read
+    from or written to it.  If provided, report(fraction) is called after
+    every read with how much of total bytes have been read.
+    """
+    def __init__(self, f, report=None, total=0):
+        self.f = f
+        self.report = report
+        self.total = total
+        self.size = 0
+        self.checksum = 0
+
+    def update(self, data):
+        self.size += len(data)
+        self.checksum = zlib.crc32(data, self.checksum)
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.update(data)
+        if self.report is not None:
+            self.report(min(self.size / max(self.total, 1), 1))
+        return data
+
+    def write(self, data):
+        self.f.write(data)
+        self.update(data)
+
 
 def get_filename(statenum):
     """Returns the absolute path and filename to a particular savestate"""
+    return get_settings_path("g-one") + "/save_" + str(statenum) + ".sav"
+
+
+def get_legacy_filename(statenum):
+    """Returns the absolute path and filename to a particular pickled
+    savestate from before snapshots
+    """
     return get_settings_path("g-one") + "/save_" + str(statenum) + ".p"
 
 
+def get_manifest_filename():
+    return get_settings_path("g-one") + "/manifest.p"
+
+
+def manifest_entry(info, size, checksum, saved=None):
+    """Returns the manifest entry of a savestate.  saved is the time it was
+    saved, default=now.
+    """
+    return {
+      'info': info,
+      'time': time.time() if saved is None else saved,
+      'size': size,
+      'checksum': checksum,
+    }
+
+
+def scan_manifest():
+    """Builds the manifest by reading every savestate"""
+    manifest = {}
+    for statenum in range(SLOTS):
+        for filename in (get_filename(statenum),
+                         get_legacy_filename(statenum)):
+            try:
+                with open(filename, 'rb') as f:
+                    data = f.read()
+                f = io.BytesIO(data)
+                if filename.endswith(".p"):
+                    info = GameUnpickler(f, None).load()
+                else:
+                    info = snapshot.read_info(f)
+            except Exception:
+                continue
+            manifest[statenum] = manifest_entry(info, len(data),
+                                                zlib.crc32(data),
+                                                os.path.getmtime(filename))
+            break
+    return manifest
+
+
+def load_manifest():
+    """Returns the manifest: a dict from the number of every slot which holds
+    a savestate to a dict of its 'info' string, the 'time' it was saved, and
+    its 'size' and 'checksum'.
+    """
+    with manifest_lock:
+        try:
+            with open(get_manifest_filename(), 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            manifest = scan_manifest()
+            save_manifest(manifest)
+            return manifest
+
+
+def replace_file(filename, write):
+    """Calls write(f) to write a temporary file and then renames it to
+    filename, so filename is never left half-written.  Returns what write
+    returns.
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + ".tmp", 'wb') as f:
+        result = write(f)
+    os.replace(filename + ".tmp", filename)
+    return result
+
+
+def save_manifest(manifest):
+    replace_file(get_manifest_filename(), lambda f: pickle.dump(manifest, f))
+
+
 def get_state_info(statenum):
-    """Returns the info portion of the savestate"""
-    filename = get_filename(statenum)
-    try:
-        with open(filename, 'rb') as f:
-            return GameUnpickler(f, None).load()
-    except Exception:
-        return None
+    """Returns the info portion of the savestate, or None if the slot is
+    empty
+    """
+    entry = load_manifest().get(statenum)
+    return None if entry is None else entry['info']
 
 
-def save_state(statenum, game):
-    filename = get_filename(statenum)
-    with open(filename, 'wb') as f:
-        pickler = GamePickler(f)
-        game_info = str(len(game.players))
-        game_info += " player, "
-        game_info += "Earthlings, " if game.earth else "Aliens, "
-        game_info += "Level " + str(game.level) + ", "
-        game_info += ["Normal", "Hard"][game.difficulty]
-        pickler.dump(game_info)
-        pickler.dump(game)
+def get_game_info(game):
+    """Returns the string describing a savestate of the given Game"""
+    game_info = str(len(game.players))
+    game_info += " player, "
+    game_info += "Earthlings, " if game.earth else "Aliens, "
+    game_info += "Level " + str(game.level) + ", "
+    game_info += ["Normal", "Hard"][game.difficulty]
+    return game_info
 
 
-def load_state(statenum, window):
+def on_main_thread(function, *args):
+    """Has pyglet's event loop call function(*args) as soon as it can.  The
+    event loop is woken up in case it is waiting for input.
+    """
+    pyglet.clock.schedule_once(lambda dt: function(*args), 0)
+    pyglet.app.platform_event_loop.notify()
+
+
+def in_background(work, done, progress=None):
+    """Calls work on a worker thread and then calls done(result, error) on
+    the main thread, where error is the exception work raised, if any.
+
+    work is given a function to report its progress with.  If progress is
+    provided, progress(fraction) is called with each report on the main
+    thread.
+    """
+    def report(fraction):
+        if progress is not None:
+            on_main_thread(progress, fraction)
+
+    def run():
+        try:
+            result, error = work(report), None
+        except Exception as e:
+            result, error = None, e
+        on_main_thread(done, result, error)
+    threading.Thread(target=run).start()
+
+
+def encode_state(game):
+    """Snapshots a Game.  Returns its info string and the uncompressed
+    snapshot, which write_state compresses.
+    """
+    info = get_game_info(game)
+    f = io.BytesIO()
+    snapshot.write(f, info, game)
+    return info, f.getvalue()
+
+
+def write_state(statenum, info, data, codec=None):
+    """Writes a snapshot to a slot, compressing it as it is written, and
+    returns the slot's new manifest entry.  codec defaults to
+    savestate.default_codec.  Safe to call from any thread.
+    """
+    def write(f):
+        f = ChecksumFile(f)
+        snapshot.convert(io.BytesIO(data), f, codec or default_codec)
+        return f
+
+    f = replace_file(get_filename(statenum), write)
+    legacy_filename = get_legacy_filename(statenum)
+    if os.path.exists(legacy_filename):
+        os.remove(legacy_filename)
+    with manifest_lock:
+        manifest = load_manifest()
+        manifest[statenum] = manifest_entry(info, f.size, f.checksum)
+        save_manifest(manifest)
+    return manifest[statenum]
+
+
+def save_state(statenum, game, codec=None):
+    """Saves a Game to a slot and returns the slot's new manifest entry.
+    codec defaults to savestate.default_codec.
+    """
+    info, data = encode_state(game)
+    return write_state(statenum, info, data, codec)
+
+
+def save_state_async(statenum, game, done, codec=None):
+    """Saves a Game to a slot without blocking.  The Game is snapshotted
+    straight away, and compressed and written on a worker thread.
+    done(entry, error) is called on the main thread afterwards, with the
+    slot's new manifest entry or the exception which stopped it being saved.
+    codec defaults to savestate.default_codec.
+    """
+    info, data = encode_state(game)
+    in_background(lambda report: write_state(statenum, info, data, codec),
+                  done)
+
+
+def read_state(statenum, report=None):
+    """Reads the savestate in a slot without building the Game.  Safe to call
+    from any thread.  If provided, report(fraction) is called as the file is
+    read.  Returns a value to pass to build_state.  Raises ValueError if the
+    savestate does not match its checksum in the manifest.
+    """
     filename = get_filename(statenum)
+    legacy = not os.path.exists(filename)
+    if legacy:
+        filename = get_legacy_filename(statenum)
     with open(filename, 'rb') as f:
-        pickler = GameUnpickler(f, window)
+        f = ChecksumFile(f, report, os.fstat(f.fileno()).st_size)
+        if legacy:
+            # Unpickling builds the Game, so leave it all to build_state.
+            state = f.read()
+        else:
+            # Snapshots are decompressed and decoded as they are read.
+            state = snapshot.decode(f)
+            f.read()
+    entry = load_manifest().get(statenum)
+    if entry is not None and entry['checksum'] != f.checksum:
+        raise ValueError("savestate " + str(statenum) + " is corrupt")
+    return state
+
+
+def build_state(state, window):
+    """Returns the Game read by read_state.  Call this from the main thread."""
+    if isinstance(state, bytes):
+        pickler = GameUnpickler(io.BytesIO(state), window)
         pickler.load()
         return pickler.load()
+    return snapshot.restore(state, window)
+
+
+def load_state(statenum, window):
+    """Loads the Game in a slot.  Raises ValueError if the savestate does not
+    match its checksum in the manifest.
+    """
+    return build_state(read_state(statenum), window)
+
+
+def load_state_async(statenum, window, done, progress=None):
+    """Loads the Game in a slot without blocking.  The savestate is read and
+    decoded on a worker thread and the Game is then built on the main thread.
+    done(game, error) is called afterwards, with the Game or the exception
+    which stopped it being loaded.  If provided, progress(fraction) is called
+    as the savestate is read.
+    """
+    def finish(state, error):
+        if error is None:
+            try:
+                state = build_state(state, window)
+            except Exception as e:
+                state, error = None, e
+        done(state, error)
+    in_background(lambda report: read_state(statenum, report), finish,
+                  progress)
@@ -0,0 +1,388 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Savestates in a compact binary format.
+
+A snapshot is written in the following order.  Every number is little-endian.
+
+1. The header: the magic bytes b'G1SS', the format version, the codec which
+   compresses the rest of the snapshot and the info string describing the
+   savestate, such as its difficulty and level.
+
+2. The Game's own state: scalars such as the score and level, the World's
+   clock, the spawner and the number of players, enemies and bullets.
+
+3. The players, enemies and bullets, each as packed arrays with one element
+   per sprite or bullet, e.g. every enemy's position and then every enemy's
+   velocity.
+
+Only state which cannot be derived is saved.  For example, an enemy's
+Earthling status is the opposite of the Game's and its rotation is always
+180.
+
+Snapshots are compressed and decompressed as a stream while they are written
+and read, using one of the standard library's codecs: zlib, lzma or bz2.  See
+CODECS.
+
+Loading is split in two.  decode only reads the file, so it can be run on a
+worker thread.  restore then builds every sprite in one pass with
+GameSprite.restore, so no sprite runs its __init__.
+
+Bump VERSION whenever the layout changes and keep reading the old versions.
+"""
+
+import bz2
+import lzma
+import struct
+import zlib
+
+import numpy as np
+import pyglet
+
+from g.one.player import Player
+from g.one.enemy import BasicEnemy, HorizontalTrackerEnemy, SplitterEnemy
+from g.one.bullet import BulletEngine
+from g.one.registry import Registry
+from g.one.world import World
+
+MAGIC = b'G1SS'
+VERSION = 2
+
+# The codecs snapshots can be compressed with.  Each is a pair of functions
+# returning a new compressor and decompressor, or None for no compression.
+CODECS = {
+  'none': (lambda: None, lambda: None),
+  'zlib': (zlib.compressobj, zlib.decompressobj),
+  'lzma': (lzma.LZMACompressor, lzma.LZMADecompressor),
+  'bz2': (bz2.BZ2Compressor, bz2.BZ2Decompressor),
+}
+# The codecs, indexed by the number saved in the header
+CODEC_NAMES = ('none', 'zlib', 'lzma', 'bz2')
+
+# The size of the chunks compressed data is read in
+CHUNK_SIZE = 64 * 1024
+
+# The enemy classes, indexed by the kind saved for each enemy
+ENEMY_KINDS = (BasicEnemy, HorizontalTrackerEnemy, SplitterEnemy)
+
+# Magic and version, followed by the rest of the header
+PREFIX = struct.Struct('<4sH')
+# Codec and the length of the info string which follows
+HEADER = struct.Struct('<BH')
+# Version 1 had no codec
+HEADER_V1 = struct.Struct('<H')
+# The Game's own state, in the order of GAME_FIELDS.  It is followed by the
+# status string.
+GAME = struct.Struct('<?BBiii?idddqbdiqIIIIqqqH')
+GAME_FIELDS = ('earth', 'difficulty', 'players', 'level', 'score', 'lives',
+               'win', 'target', 'status_countdown', 'dt', 'accumulator',
+               'ticks', 'spawner', 'spawner_cooldown', 'spawner_count',
+               'next_handle', 'enemies', 'bullets', 'capacity', 'high_water',
+               'hits', 'misses', 'peak', 'status_length')
+
+# The names and types of the packed arrays.  Each array has one element per
+# sprite or bullet, and positions and velocities are pairs.
+PLAYER_ARRAYS = (('pos', '<f8', 2), ('prev', '<f8', 2), ('health', '<i4', 1),
+                 ('cooldown', '<f8', 1))
+ENEMY_ARRAYS = (('kind', '<u1', 1), ('handle', '<i8', 1), ('pos', '<f8', 2),
+                ('prev', '<f8', 2), ('vel', '<f8', 2), ('health', '<i4', 1),
+                ('cooldown', '<f8', 1), ('player', '<i1', 1))
+BULLET_ARRAYS = (('pos', '<f8', 2), ('prev', '<f8', 2), ('vel', '<f8', 2),
+                 ('half', '<f8', 2), ('bounces', '<i4', 1), ('kind', '<i1', 1),
+                 ('earth', '?', 1), ('owner', '?', 1))
+
+
+def write_arrays(f, layout, arrays):
+    """Writes the arrays in a dict in the order and types of a layout"""
+    for name, dtype, width in layout:
+        f.write(np.ascontiguousarray(arrays[name], dtype).tobytes())
+
+
+def read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated snapshot")
+    return data
+
+
+def read_arrays(f, layout, count):
+    """Reads arrays of count elements written by write_arrays into a dict"""
+    arrays = {}
+    for name, dtype, width in layout:
+        dtype = np.dtype(dtype)
+        data = read_exactly(f, count * width * dtype.itemsize)
+        array = np.frombuffer(data, dtype)
+        arrays[name] = array.reshape(count, 2) if width == 2 else array
+    return arrays
+
+
+def sprite_positions(sprites):
+    """Returns the positions and saved previous positions of some sprites as
+    two arrays of pairs.  Sprites with no previous position are saved as
+    being where they are now.
+    """
+    pos = [(s._x, s._y) for s in sprites]
+    prev = [pos[i] if s._prev is None else s._prev
+            for i, s in enumerate(sprites)]
+    return (np.array(pos, '<f8').reshape(-1, 2),
+            np.array(prev, '<f8').reshape(-1, 2))
+
+
+class CompressedWriter():
+    """Wraps a binary file, compressing everything written to it with a codec
+    as it is written.  Call close to write what the compressor holds back.
+    The file itself is left open.
+    """
+    def __init__(self, f, codec):
+        self.f = f
+        self.compressor = CODECS[codec][0]()
+
+    def write(self, data):
+        if self.compressor is None:
+            self.f.write(data)
+        else:
+            self.f.write(self.compressor.compress(data))
+
+    def close(self):
+        if self.compressor is not None:
+            self.f.write(self.compressor.flush())
+
+
+class DecompressedReader():
+    """Wraps a binary file, decompressing it with a codec as it is read.
+    Compressed data is read a chunk at a time as needed.
+    """
+    def __init__(self, f, codec):
+        self.f = f
+        self.decompressor = CODECS[codec][1]()
+        self.buffer = bytearray()
+
+    def read(self, size):
+        if self.decompressor is None:
+            return self.f.read(size)
+        while len(self.buffer) < size and not self.decompressor.eof:
+            chunk = self.f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.buffer += self.decompressor.decompress(chunk)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+def write_header(f, info, codec):
+    info = info.encode()
+    f.write(PREFIX.pack(MAGIC, VERSION))
+    f.write(HEADER.pack(CODEC_NAMES.index(codec), len(info)))
+    f.write(info)
+
+
+def read_header(f):
+    """Reads the header from the start of a file and returns its info string
+    and codec.  Raises ValueError if the file is not a snapshot or is from a
+    newer version of G-One.
+    """
+    magic, version = PREFIX.unpack(read_exactly(f, PREFIX.size))
+    if magic != MAGIC:
+        raise ValueError("not a snapshot")
+    if version > VERSION:
+        raise ValueError("snapshot version %d is not supported" % version)
+    if version == 1:
+        codec = 0
+        length, = HEADER_V1.unpack(read_exactly(f, HEADER_V1.size))
+    else:
+        codec, length = HEADER.unpack(read_exactly(f, HEADER.size))
+    if codec >= len(CODEC_NAMES):
+        raise ValueError("unknown snapshot codec %d" % codec)
+    return read_exactly(f, length).decode(), CODEC_NAMES[codec]
+
+
+def read_info(f):
+    """Reads the header from the start of a file and returns its info string.
+    Raises ValueError if the file is not a snapshot or is from a newer
+    version of G-One.
+    """
+    return read_header(f)[0]
+
+
+def convert(src, dst, codec):
+    """Copies a snapshot from one binary file to another, compressing it with
+    the given codec instead.  Returns the snapshot's info string.
+    """
+    info, src_codec = read_header(src)
+    write_header(dst, info, codec)
+    src = DecompressedReader(src, src_codec)
+    dst = CompressedWriter(dst, codec)
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+        dst.write(chunk)
+    dst.close()
+    return info
+
+
+def write(f, info, game, codec='none'):
+    """Writes a snapshot of a Game to a binary file, compressed with the
+    given codec
+    """
+    from g.one.game import Game
+    write_header(f, info, codec)
+    f = CompressedWriter(f, codec)
+    players = game.players
+    enemies = list(game.enemies)
+    bullets = game.bullets
+    spawner = game.spawner
+    status = game.status.encode()
+    f.write(GAME.pack(
+      game.earth, game.difficulty, len(players),
+      game.level, game.score, game.lives, game.win, game._Game__target,
+      game.status_countdown, game.world.dt, game.world.accumulator,
+      game.world.ticks,
+      -1 if spawner is None else Game.spawners.index(type(spawner)),
+      0 if spawner is None else spawner.cooldown,
+      0 if spawner is None else spawner.count,
+      game.enemies.next_handle, len(enemies),
+      bullets.count, bullets.capacity, bullets.high_water,
+      bullets.hits, bullets.misses, bullets.peak,
+      len(status)
+    ))
+    f.write(status)
+
+    pos, prev = sprite_positions(players)
+    write_arrays(f, PLAYER_ARRAYS, {
+      'pos': pos,
+      'prev': prev,
+      'health': [p.health for p in players],
+      'cooldown': [p.cooldown for p in players],
+    })
+
+    pos, prev = sprite_positions(enemies)
+    write_arrays(f, ENEMY_ARRAYS, {
+      'kind': [ENEMY_KINDS.index(type(e)) for e in enemies],
+      'handle': [game.enemies.handle(e) for e in enemies],
+      'pos': pos,
+      'prev': prev,
+      'vel': np.array([e.vel for e in enemies], '<f8').reshape(-1, 2),
+      'health': [e.health for e in enemies],
+      'cooldown': [e.cooldown for e in enemies],
+      'player': [players.index(e.player) if hasattr(e, 'player') else -1
+                 for e in enemies],
+    })
+
+    n = bullets.count
+    write_arrays(f, BULLET_ARRAYS,
+                 {name: getattr(bullets, name)[:n]
+                  for name in BulletEngine.arrays})
+    f.close()
+
+
+def decode(f):
+    """Reads a snapshot from a binary file into a dict of the Game's state and
+    the packed arrays, without building anything.  Unlike restore, this is
+    safe to call from any thread.  Raises ValueError if the file is not a
+    valid snapshot.
+    """
+    info, codec = read_header(f)
+    f = DecompressedReader(f, codec)
+    state = dict(zip(GAME_FIELDS, GAME.unpack(read_exactly(f, GAME.size))))
+    state['status'] = read_exactly(f, state['status_length']).decode()
+    state['player_arrays'] = read_arrays(f, PLAYER_ARRAYS, state['players'])
+    state['enemy_arrays'] = read_arrays(f, ENEMY_ARRAYS, state['enemies'])
+    state['bullet_arrays'] = read_arrays(f, BULLET_ARRAYS, state['bullets'])
+    return state
+
+
+def restore(state, window):
+    """Builds and returns the Game decoded by decode, which is headless if
+    window is None.  Call this from the main thread.
+    """
+    from g.one.game import Game
+    earth = state['earth']
+    game = Game.__new__(Game)
+    game.window = window
+    game.earth = earth
+    game.difficulty = state['difficulty']
+    game.deleted = False
+    game.batch = None if window is None else pyglet.graphics.Batch()
+    game.win = state['win']
+    game._Game__target = state['target']
+    game._status = state['status']
+    game.status_countdown = state['status_countdown']
+    game._score = state['score']
+    game._lives = state['lives']
+    game._level = state['level']
+
+    game.world = World(game)
+    game.world.dt = state['dt']
+    game.world.accumulator = state['accumulator']
+    game.world.ticks = state['ticks']
+
+    game.spawner = None
+    if state['spawner'] >= 0:
+        game.spawner = Game.spawners[state['spawner']](game)
+        game.spawner.cooldown = state['spawner_cooldown']
+        game.spawner.count = state['spawner_count']
+
+    # Converting the arrays to lists first keeps NumPy scalars out of the
+    # sprites and is much faster than indexing them element by element.
+    arrays = state['player_arrays']
+    game.players = []
+    for pos, prev, health, cooldown in zip(*(arrays[name].tolist()
+                                             for name, *_ in PLAYER_ARRAYS)):
+        player = Player.restore(game, earth, pos, tuple(prev))
+        player.keystate = [False] * 5
+        player.health = health
+        player.cooldown = cooldown
+        game.players.append(player)
+
+    arrays = state['enemy_arrays']
+    enemies = []
+    for (kind, handle, pos, prev, vel, health, cooldown,
+         player) in zip(*(arrays[name].tolist()
+                          for name, *_ in ENEMY_ARRAYS)):
+        enemy = ENEMY_KINDS[kind].restore(game, not earth, pos, tuple(prev),
+                                          180)
+        enemy.vel = tuple(vel)
+        enemy.health = health
+        enemy.cooldown = cooldown
+        if player >= 0:
+            enemy.player = game.players[player]
+        enemies.append(enemy)
+    game.enemies = Registry.from_handles(enemies,
+                                         arrays['handle'].tolist(),
+                                         state['next_handle'])
+
+    arrays = state['bullet_arrays']
+    count = state['bullets']
+    bullets = BulletEngine(game, game.batch, state['capacity'],
+                           state['high_water'])
+    for name in BulletEngine.arrays:
+        getattr(bullets, name)[:count] = arrays[name]
+    bullets.count = count
+    bullets.hits = state['hits']
+    bullets.misses = state['misses']
+    bullets.peak = state['peak']
+    bullets.update_vertices()
+    game.bullets = bullets
+
+    game.rebuild()
+    return game
+
+
+def read(f, window):
+    """Reads a snapshot from a binary file and returns the Game, which is
+    headless if window is None.  Raises ValueError if the file is not a valid
+    snapshot.
+    """
+    return restore(decode(f), window)
@@ -0,0 +1,147 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+class SpatialHash():
+    """A uniform grid over the playfield used as a collision broad-phase.
+
+    Sprites are binned into every cell their bounding box touches.  Sprites
+    which are partially or entirely offscreen are binned into the nearest
+    cells on the edge of the grid, so two sprites which intersect will always
+    share at least one cell.
+
+    Every sprite is given an order when it is inserted.  Queries return their
+    candidates in this order so that, as long as sprites are inserted in the
+    same order as they are appended to their list, the first hit found is the
+    same as the first hit of a linear scan of that list.
+
+    self.version is incremented whenever a sprite is inserted or moved, so
+    callers can tell whether results they computed earlier may be stale.
+    """
+    def __init__(self, cell_size=64, width=854, height=480):
+        """Keyword arguments:
+
+        cell_size     -- the width and height of each cell
+        width, height -- the size of the playfield
+        """
+        self.cell_size = cell_size
+        self.columns = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        """Removes all sprites."""
+        self.cells = {}
+        self.entries = {}
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, sprite):
+        return sprite in self.entries
+
+    def cells_for(self, sprite):
+        """Returns a tuple of the cells the given sprite touches."""
+        size = self.cell_size
+        columns = self.columns
+        left = int(sprite.left // size)
+        right = int(sprite.right // size)
+        bottom = int(sprite.bottom // size)
+        top = int(sprite.top // size)
+        if left < 0:
+            left = 0
+        if right >= columns:
+            right = columns - 1
+        if bottom < 0:
+            bottom = 0
+        if top >= self.rows:
+            top = self.rows - 1
+        # A sprite entirely beyond an edge still belongs to that edge's cells
+        if right < left:
+            left = right = 0 if right < 0 else columns - 1
+        if top < bottom:
+            bottom = top = 0 if top < 0 else self.rows - 1
+        if left == right and bottom == top:
+            return (bottom * columns + left,)
+        return tuple(row * columns + column
+                     for row in range(bottom, top+1)
+                     for column in range(left, right+1))
+
+    def insert(self, sprite):
+        """Adds a sprite after all of the sprites already in the grid."""
+        cells = self.cells_for(sprite)
+        self.entries[sprite] = (self.next_order, cells)
+        self.next_order += 1
+        self.version += 1
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(sprite)
+
+    def remove(self, sprite):
+        """Removes a sprite.  Does nothing if the sprite is not in the grid."""
+        entry = self.entries.pop(sprite, None)
+        if entry is None:
+            return
+        for cell in entry[1]:
+            self.cells[cell].remove(sprite)
+
+    def move(self, sprite):
+        """Call this after a sprite has moved to update the cells it is in.
+        The sprite keeps its order.  Does nothing if the sprite is not in the
+        grid.
+        """
+        entry = self.entries.get(sprite)
+        if entry is None:
+            return
+        self.version += 1
+        order, old_cells = entry
+        cells = self.cells_for(sprite)
+        if cells == old_cells:
+            return
+        for cell in old_cells:
+            self.cells[cell].remove(sprite)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(sprite)
+        self.entries[sprite] = (order, cells)
+
+    def rebuild(self, sprites):
+        """Replaces the contents of the grid with the given sprites, ordered
+        as they are in the given iterable.
+        """
+        self.clear()
+        for sprite in sprites:
+            self.insert(sprite)
+
+    def query(self, sprite):
+        """Returns a list of the sprites sharing a cell with the given sprite,
+        in order.  The given sprite itself is never included.
+        """
+        cells = self.cells_for(sprite)
+        if len(cells) == 1:
+            candidates = self.cells.get(cells[0])
+            if not candidates:
+                return []
+            candidates = set(candidates)
+        else:
+            candidates = set()
+            for cell in cells:
+                candidates.update(self.cells.get(cell, ()))
+        candidates.discard(sprite)
+        if len(candidates) < 2:
+            return list(candidates)
+        entries = self.entries
+        return sorted(candidates, key=lambda x: entries[x][0])
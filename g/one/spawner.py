@@ -14,8 +14,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import pyglet
-
 from g.one.enemy import *
 
 
@@ -27,11 +25,10 @@ class EnemySpawner():
         self.game = game
         self.cooldown = 0
         self.count = 0
-        pyglet.clock.schedule_interval(self.update, 1/60)
 
     def update(self, dt):
-        if not self.game.paused:
-            self.cooldown -= dt
+        """Called by the Game's World once per tick."""
+        self.cooldown -= dt
 
     def spawn(self, amount):
         """Override this to spawn enemies.  This method should return a list
@@ -42,11 +39,6 @@ class EnemySpawner():
         """
         pass
 
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-        EnemySpawner.__init__(self, self.game)
-        self.__dict__.update(state)
-
 # The code below follows the patterns described in the docstrings above and
 # should be self-explanatory.
 
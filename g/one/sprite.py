@@ -19,19 +19,32 @@ import math
 import pyglet
 
 from g.one.resources import Resources
+from g.one.layers import SPRITES
+from g.one.spatial_hash import SpatialHash
 
 
-class GameSprite(pyglet.sprite.Sprite):
+class GameSprite():
     """This is the abstract game sprite class.
 
     It provides the basic functionality of sprites used during a game such as
     collision detection and bouncing.
 
+    A GameSprite is not a pyglet Sprite.  It keeps its own position and
+    rotation and passes them on to a pyglet Sprite in self.sprite, which only
+    exists if there is a drawing batch.  Without a batch, such as in a
+    headless Game, no window or GL context is needed.
+
+    The pyglet Sprite is drawn between the position the sprite had before the
+    last World tick and its current position, see interpolate.  Setting x, y,
+    rotation or any of the edges therefore only stages the change.  Staged
+    changes are committed to the pyglet Sprite together when it is next
+    interpolated, so its vertices are recomputed at most once per frame.
+
     Subclass this for any sprites which will be used during a game.
     """
     def __init__(self, stage, earth, batch=None):
-        """Initialises the sprite and sets up the update method to be called
-        every (1/60) seconds.  Causes the image to be anchored to its center.
+        """Initialises the sprite.  Causes the image to be anchored to its
+        center.  The update method will be called by the stage's World.
 
 
         Keyword arguments:
@@ -41,38 +54,101 @@ class GameSprite(pyglet.sprite.Sprite):
         """
         self.stage = stage
         self.earth = earth
+        self.deleted = False
         if batch is None:
             batch = stage.batch
-        img = self.get_image()
-        img.anchor_x = img.width // 2
-        img.anchor_y = img.height // 2
-        pyglet.sprite.Sprite.__init__(self, img=img, batch=batch)
-        pyglet.clock.schedule_interval(self.__update, 1/60)
+        self.image = self.get_image()
+        self.image.anchor_x = self.image.width // 2
+        self.image.anchor_y = self.image.height // 2
+        self._x = 0
+        self._y = 0
+        self._rotation = 0
+        self._prev = None
+        self._batch = batch
+        self.create_sprite()
+
+    @classmethod
+    def restore(cls, stage, earth, pos, prev=None, rotation=0, batch=None):
+        """Returns a sprite of this class in the given state without calling
+        __init__, for loading many sprites at once.  The caller sets any
+        attributes of the subclass's own.  prev is the position saved by
+        save_position, if any.
+        """
+        sprite = cls.__new__(cls)
+        sprite.stage = stage
+        sprite.earth = earth
+        sprite.deleted = False
+        sprite.image = sprite.get_image()
+        sprite.image.anchor_x = sprite.image.width // 2
+        sprite.image.anchor_y = sprite.image.height // 2
+        sprite._x, sprite._y = pos
+        sprite._rotation = rotation
+        sprite._prev = prev
+        sprite._batch = stage.batch if batch is None else batch
+        sprite.create_sprite()
+        return sprite
+
+    def create_sprite(self):
+        """Creates the pyglet Sprite which draws this sprite, if there is a
+        drawing batch.
+        """
+        if self._batch is None:
+            self.sprite = None
+            return
+        self.sprite = pyglet.sprite.Sprite(self.image, self._x, self._y,
+                                           batch=self._batch, group=SPRITES)
+        self.sprite.rotation = self._rotation
+        self._committed = (self._x, self._y, self._rotation)
 
     def delete(self):
         """Called when the sprite is to be deleted.
 
-        Stops the update method from being called and then calls the pyglet
-        Sprite delete method.
-        """
-        pyglet.clock.unschedule(self.__update)
-        pyglet.sprite.Sprite.delete(self)
-
-    def __update(self, dt):
-        """Calls the proper update method if the game is not paused.  Do NOT
-        override this method when subclassing.  Instead, override the update
-        method below.
+        Marks the sprite as deleted and then deletes the pyglet Sprite.
         """
-        if self.stage.paused:
-            return
-        self.update(dt)
+        self.deleted = True
+        if self.sprite is not None:
+            self.sprite.delete()
+            self.sprite = None
 
     def update(self, dt):
-        """Called every (1/60) seconds if the game is not paused.  Override
+        """Called once per World tick while the game is not paused.  Override
         this method when subclassing.
         """
         pass
 
+    def save_position(self):
+        """Remembers the current position as the one to interpolate from.
+        Called by the World before each tick.  Call it after moving the sprite
+        to make it jump to its new position instead of sliding there.
+        """
+        self._prev = (self._x, self._y)
+
+    def interpolate(self, alpha):
+        """Moves the pyglet Sprite alpha of the way from the position saved by
+        save_position to the current position.  Sprites created since the last
+        tick are drawn at their current position.  Returns True if the pyglet
+        Sprite had to be changed.
+        """
+        if self.sprite is None:
+            return False
+        if self._prev is None:
+            return self.commit(self._x, self._y)
+        prev_x, prev_y = self._prev
+        return self.commit(prev_x + (self._x - prev_x) * alpha,
+                           prev_y + (self._y - prev_y) * alpha)
+
+    def commit(self, x, y):
+        """Sets the pyglet Sprite's position and rotation in one update, which
+        recomputes its vertices once.  Does nothing if they are unchanged.
+        Returns True if the pyglet Sprite was changed.
+        """
+        transform = (x, y, self._rotation)
+        if transform == self._committed:
+            return False
+        self._committed = transform
+        self.sprite.update(x=x, y=y, rotation=self._rotation)
+        return True
+
     def get_image(self):
         """Returns the image to be used for this sprite.  Override this method
         when subclassing
@@ -92,7 +168,12 @@ class GameSprite(pyglet.sprite.Sprite):
         """Returns the first sprite in the sprite_list that this sprite
         intersects with.  If this sprite does not intersect with any sprites in
         the sprite list, returns None.
+
+        sprite_list may also be a SpatialHash, in which case only the sprites
+        sharing a cell with this sprite are checked.
         """
+        if isinstance(sprite_list, SpatialHash):
+            sprite_list = sprite_list.query(self)
         for sprite in sprite_list:
             if (self.intersect(sprite)):
                 return sprite
@@ -164,6 +245,30 @@ class GameSprite(pyglet.sprite.Sprite):
     # The properties below are self-explanatory, keeping in mind that self.x
     # and self.y point to the center of the sprite.
 
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = value
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = value
+
+    @property
+    def rotation(self):
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value):
+        self._rotation = value
+
     @property
     def left(self):
         return self.x - self.image.width/2
@@ -214,12 +319,34 @@ class GameSprite(pyglet.sprite.Sprite):
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        del state['_texture']
-        del state['_vertex_list']
-        del state['_group']
+        del state['image']
+        del state['sprite']
+        state.pop('_committed', None)
         return state
 
     def __setstate__(self, state):
+        # Savestates from before GameSprite stopped being a pyglet Sprite
+        # have no 'deleted' and carry the Sprite's own attributes, of which
+        # only _x, _y, _rotation and _batch are used.  Savestates from before
+        # interpolation have no '_prev'.
+        self.deleted = False
+        self._prev = None
         self.__dict__.update(state)
-        GameSprite.__init__(self, self.stage, self.earth, self._batch)
-        self.__dict__.update(state)
+        self.image = self.get_image()
+        self.create_sprite()
+
+
+class Box():
+    """An axis-aligned bounding box.
+
+    Boxes can be used in place of a GameSprite in collision checks, for example
+    to query a SpatialHash on behalf of something which is not a sprite.
+    """
+    intersect = GameSprite.intersect
+    collide_once = GameSprite.collide_once
+
+    def __init__(self, left, right, bottom, top):
+        self.left = left
+        self.right = right
+        self.bottom = bottom
+        self.top = top
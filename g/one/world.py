@@ -0,0 +1,145 @@
+# This file is part of G-One.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import pyglet
+
+from g.one.profiler import Profiler, clock_callbacks
+
+
+class World():
+    """Steps the game simulation at a fixed rate.
+
+    A single clock callback is used for the whole game instead of one per
+    sprite.  Each tick steps the stage's players, then enemies, then bullets,
+    then the spawner and finally the stage's own update method.  The World is
+    not scheduled at all while the game is paused.
+
+    Drawing is not tied to ticking.  Before each frame is drawn, interpolate
+    places every sprite and bullet between its positions from the last two
+    ticks, so motion is smooth whether the display refreshes faster or slower
+    than the simulation rate.
+    """
+    # The most ticks which will be run for a single frame.  Any time beyond
+    # this is dropped so that a long hitch does not cause a spiral of death.
+    max_steps = 5
+    # The default number of ticks per second.  Bullet collision is swept, so
+    # lower rates save CPU without bullets passing through ships.
+    rate = 60
+
+    def __init__(self, stage, rate=None):
+        """Keyword arguments:
+
+        stage -- the stage whose sprites will be stepped
+        rate  -- the number of ticks per second, World.rate by default
+        """
+        self.stage = stage
+        self.dt = 1 / (rate or World.rate)
+        self.accumulator = 0
+        self.ticks = 0
+        self.running = False
+
+    def start(self):
+        """Starts stepping the simulation.  Does nothing if already started."""
+        if not self.running:
+            self.running = True
+            self.accumulator = 0
+            pyglet.clock.schedule(self.update)
+
+    def stop(self):
+        """Stops stepping the simulation.  Does nothing if already stopped."""
+        if self.running:
+            self.running = False
+            pyglet.clock.unschedule(self.update)
+
+    def update(self, dt):
+        """Clock callback.  Runs as many ticks as fit into the elapsed time."""
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.dt:
+            if steps >= World.max_steps:
+                self.accumulator = 0
+                break
+            self.accumulator -= self.dt
+            steps += 1
+            self.step()
+            if not self.running:
+                break
+
+    def step(self):
+        """Advances the simulation by exactly one tick."""
+        stage = self.stage
+        dt = self.dt
+        self.ticks += 1
+        tick_start = Profiler.start()
+        start = Profiler.start()
+        groups = [(stage.players, stage.player_index),
+                  (stage.enemies, stage.enemy_index)]
+        for group, index in groups:
+            # Sprites may be added or deleted during the tick.  Registries
+            # skip sprites deleted before their turn and leave new sprites
+            # until the next tick.
+            for sprite in group:
+                sprite.save_position()
+                sprite.update(dt)
+                if stage.deleted:
+                    return
+                index.move(sprite)
+        Profiler.stop('sprites', start)
+
+        start = Profiler.start()
+        stage.bullets.update(dt)
+        Profiler.stop('bullets', start)
+        if stage.deleted:
+            return
+
+        if stage.spawner is not None:
+            stage.spawner.update(dt)
+
+        start = Profiler.start()
+        stage.update(dt)
+        Profiler.stop('game update', start)
+        Profiler.stop('tick', tick_start)
+
+        if Profiler.enabled and not stage.deleted:
+            Profiler.count('enemies', len(stage.enemies))
+            Profiler.count('bullets', len(stage.bullets))
+            Profiler.count('clock callbacks', clock_callbacks())
+
+    @property
+    def alpha(self):
+        """How far the time not yet simulated is into the next tick, from 0 to
+        1.
+        """
+        return min(self.accumulator / self.dt, 1)
+
+    def interpolate(self):
+        """Moves the drawn sprites and bullets to where they were alpha of the
+        way through the last tick.  Call this before drawing the stage.
+        """
+        stage = self.stage
+        alpha = self.alpha
+        commits = 0
+        for group in (stage.players, stage.enemies):
+            for sprite in group:
+                commits += sprite.interpolate(alpha)
+        stage.bullets.update_vertices(alpha)
+        if Profiler.enabled:
+            Profiler.count('sprite commits', commits)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['running'] = False
+        return state
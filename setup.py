@@ -14,6 +14,7 @@ setup(
         'g.one.resources': ['*.png', '*.wav']
     },
     install_requires=[
-        'pyglet'
+        'pyglet',
+        'numpy'
     ]
 )